@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -6,8 +7,21 @@ from src.api.data_routes import router as data_router
 from src.api.banner_routes import router as banner_router
 from src.api.claim_routes import router as claim_router
 from src.api.regen_routes import router as regen_router
+from src.api.province_routes import router as province_router
+from src.scripts.util.imagechecker import preload
+from src.scripts.util.regen_jobs import shutdown as shutdown_regen_jobs
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the province raster before the first province lookup
+    try:
+        preload()
+    except Exception as e:
+        print(f"Province raster not preloaded: {e}")
+    yield
+    shutdown_regen_jobs()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -24,3 +38,4 @@ app.include_router(data_router)
 app.include_router(banner_router)
 app.include_router(claim_router)
 app.include_router(regen_router)
+app.include_router(province_router)
@@ -1,9 +1,113 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from src.scripts.bannergen.bannergen import BASE_WIDTH, BASE_HEIGHT, banner_pngs, pattern_names
 from src.scripts.bannergen.randombanner import generate_random_banner
+from src.scripts.util.worker_pool import RENDER_WORKERS, run_blocking, run_in_process, read_json_body
+import asyncio
+import io
+import json
+import random
+import zipfile
 
 router = APIRouter()
 
+# Most banners one batch request may render
+MAX_BATCH_SIZE = 256
+# Largest scale factor a batch request may ask for (a banner is 20x40 pixels at scale 1)
+MAX_SCALE = 32
+# Most pixels one batch request may render, e.g. 256 banners at scale 11 or 40 at scale 32
+MAX_BATCH_PIXELS = 32 * 1024 * 1024
+# Banners per render task: a batch is split across the render processes, and concurrent batches
+# take turns on them chunk by chunk
+CHUNK_SIZE = 16
+
 @router.get("/generator/banner")
-async def generate_banner():
-    return JSONResponse(content=generate_random_banner())
\ No newline at end of file
+async def generate_banner(seed: int = None):
+    rng = random if seed is None else random.Random(seed)
+    return JSONResponse(content=await run_blocking(generate_random_banner, rng))
+
+def valid_patterns(patterns):
+    return isinstance(patterns, list) and all(isinstance(entry, str) and "." in entry for entry in patterns)
+
+def unknown_patterns(banners):
+    """
+    Pattern names used by the banners that have no texture in input/banner.
+    """
+    used = {entry.split(".")[1].lower() for patterns in banners for entry in patterns}
+    return sorted(used - pattern_names())
+
+def check_batch_size(count, scale):
+    if count > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} banners per request.")
+    if count * BASE_WIDTH * BASE_HEIGHT * scale * scale > MAX_BATCH_PIXELS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PIXELS} pixels per request, use fewer banners or a smaller scale.")
+
+async def render_batch(banners, scale):
+    """
+    Renders banners to PNG bytes on the render processes, CHUNK_SIZE banners per task.
+    """
+    chunk_size = max(1, min(CHUNK_SIZE, -(-len(banners) // RENDER_WORKERS)))
+    chunks = [banners[i:i + chunk_size] for i in range(0, len(banners), chunk_size)]
+    rendered = await asyncio.gather(*(run_in_process(banner_pngs, chunk, scale) for chunk in chunks))
+    return [png for pngs in rendered for png in pngs]
+
+def build_archive(banners, pngs):
+    """
+    Zips rendered banners as banner_0.png, banner_1.png, ... together with banners.json, which
+    lists the pattern list of every file. PNGs are already compressed, so they are stored as is.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        manifest = []
+        for i, (patterns, png) in enumerate(zip(banners, pngs)):
+            file_name = f"banner_{i}.png"
+            archive.writestr(file_name, png)
+            manifest.append({"file": file_name, "patterns": patterns})
+        archive.writestr("banners.json", json.dumps(manifest, indent=2))
+    return buffer.getvalue()
+
+@router.post("/generator/banners")
+async def generate_banners(request: Request):
+    """
+    Renders many banners in one call and returns them as a zip archive.
+    The body is either {"banners": [[pattern, ...], ...]} or {"count": n, "seed": s} for random
+    banners (the same seed always gives the same banners), with an optional "scale" (default 10).
+    """
+    payload = await read_json_body(request)
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Payload must be a JSON object.")
+
+    scale = payload.get("scale", 10)
+    if not isinstance(scale, int) or not 1 <= scale <= MAX_SCALE:
+        raise HTTPException(status_code=400, detail=f"scale must be an integer from 1 to {MAX_SCALE}.")
+
+    if "banners" in payload:
+        banners = payload["banners"]
+        if not isinstance(banners, list) or not all(valid_patterns(patterns) for patterns in banners):
+            raise HTTPException(status_code=400, detail='banners must be a list of pattern lists like ["RED.BASE", "WHITE.CROSS"].')
+        check_batch_size(len(banners), scale)
+        unknown = await run_blocking(unknown_patterns, banners)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown patterns: {unknown}")
+    else:
+        count = payload.get("count")
+        if not isinstance(count, int) or count < 1:
+            raise HTTPException(status_code=400, detail="Give either banners or a positive count.")
+        check_batch_size(count, scale)
+        seed = payload.get("seed")
+        if seed is not None and not isinstance(seed, (int, str)):
+            raise HTTPException(status_code=400, detail="seed must be an integer or a string.")
+        rng = random.Random(seed)
+        banners = [generate_random_banner(rng) for _ in range(count)]
+
+    try:
+        pngs = await render_batch(banners, scale)
+        archive = await run_blocking(build_archive, banners, pngs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+    return Response(
+        content=archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="banners.zip"'},
+    )
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
-import os
-import json
 
 from src.scripts.util.auth import HASHED_KEY
-from src.scripts.util.queue import RAW_QUEUE_PATH
+from src.scripts.util.queue import replace_queue
+from src.scripts.util.worker_pool import run_blocking, read_json_body
 
 router = APIRouter()
 
@@ -16,15 +15,13 @@ async def upload_queue(hashed_key: str, request: Request):
 
     try:
         # 2. Parse full JSON queue from the request
-        payload = await request.json()
+        payload = await read_json_body(request)
 
         if not isinstance(payload, dict):
             raise HTTPException(status_code=400, detail="Payload must be a JSON object.")
 
         # 3. Save it to input/queue.json
-        os.makedirs(os.path.dirname(RAW_QUEUE_PATH), exist_ok=True)
-        with open(RAW_QUEUE_PATH, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2)
+        await run_blocking(replace_queue, payload)
 
         return JSONResponse(content={
             "success": True,
@@ -32,5 +29,7 @@ async def upload_queue(hashed_key: str, request: Request):
             "modes": list(payload.keys())
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
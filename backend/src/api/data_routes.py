@@ -1,43 +1,68 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
 import os
-import json
-
-import concurrent.futures
-
+import threading
+from src.scripts.util.dirty_regions import UPLOAD_SOURCES, find_dirty_regions
+from src.scripts.util.queue import enqueue_all
+from src.scripts.util.response_cache import load_entry, cached_response, compact_json
+from src.scripts.util.worker_pool import run_blocking, read_json_body, write_json
 
 router = APIRouter()
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # Optional: tune this if needed
 
 INPUTS_DIR = os.path.join(os.path.dirname(__file__), "..", "input")
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "defines")
 
+# Uploads are diffed against the files they replace, so they are saved one at a time
+upload_lock = threading.Lock()
+
+def save_region_data(mode, payload, target_path):
+    """
+    Writes uploaded data and adds the regions whose images it changes to the raw queue.
+
+    :return: Mode -> queued "r,g,b" strings, or None if the upload was not diffed
+    """
+    with upload_lock:
+        dirty = None
+        if mode in UPLOAD_SOURCES:
+            try:
+                dirty = find_dirty_regions(mode, payload)
+            except Exception as e:
+                print(f"⚠️ Could not diff {mode} data, nothing queued: {e}")
+        write_json(target_path, payload, ensure_ascii=False, indent=2)
+        if dirty:
+            enqueue_all(dirty)
+    return dirty
+
 @router.get("/data/{map_type}")
-async def get_map(map_type: str):
+async def get_map(map_type: str, request: Request):
     filename = f"{map_type}.json"
     file_path = os.path.join(DATA_DIR, filename)
 
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)  # Load JSON content
-        return JSONResponse(content=data)  # Return JSON directly
+    # Serialized once per file version, then served from memory (304 if the client has it)
+    entry = await run_blocking(load_entry, file_path, "application/json", transform=compact_json, compress=True)
+    if entry is not None:
+        return cached_response(request, entry)
 
     return JSONResponse(content={"error": "Data not found"}, status_code=404)
 
 @router.post("/data/upload/{mode}")
 async def upload_region_data(mode: str, request: Request):
     try:
-        payload = await request.json()
+        payload = await read_json_body(request)
 
         # Save the region file to input/{mode}.json
         if mode == "nation" or mode == "queue":
             target_path = os.path.join(INPUTS_DIR, f"{mode}.json")
         else:
             target_path = os.path.join(DATA_DIR, f"{mode}.json")
-        with open(target_path, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
+        queued = await run_blocking(save_region_data, mode, payload, target_path)
 
-        return JSONResponse(content={"message": f"{mode.capitalize()} data saved successfully."}, status_code=200)
+        return JSONResponse(content={
+            "message": f"{mode.capitalize()} data saved successfully.",
+            "queued": queued,
+        }, status_code=200)
 
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
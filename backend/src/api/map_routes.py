@@ -1,50 +1,189 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from PIL import Image
+import io
 import os
-import time
 
 router = APIRouter()
 
 MAPS_DIR = os.path.join(os.path.dirname(__file__), "..", "output", "maps")
+VECTORS_DIR = os.path.join(os.path.dirname(__file__), "..", "output", "vectors")
 INPUTS_DIR = os.path.join(os.path.dirname(__file__), "..", "input")
 
-from src.scripts.util.imagechecker import find_province
+from src.scripts.util.imagechecker import find_province, find_provinces
+from src.scripts.mapgen.tilegen import TILES_DIR, TILE_SIZE, load_tile_info, tile_path
+from src.scripts.mapgen.regiongen import REGIONS_DIR
+from src.scripts.util.snapshots import current_version, list_versions
+from src.scripts.util.response_cache import load_entry, cached_response
+from src.scripts.util.worker_pool import run_blocking, read_json_body
+
+def _empty_tile():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+# Served for tiles inside the map that have nothing painted on them
+EMPTY_TILE = _empty_tile()
+
+# Map name -> (tiles.json mtime and size, layout), so tile requests do not parse every tile hash again
+_tile_info = {}
+
+def get_tile_info(map_type):
+    """
+    Tile pyramid layout of a map (tiles.json without the tile hashes), reloaded only when tiles.json changes.
+    """
+    if map_type in ("", ".", "..") or os.path.basename(map_type) != map_type:
+        return None
+    try:
+        st = os.stat(os.path.join(TILES_DIR, map_type, "tiles.json"))
+    except FileNotFoundError:
+        _tile_info.pop(map_type, None)
+        return None
+    signature = (st.st_mtime_ns, st.st_size)
+
+    cached = _tile_info.get(map_type)
+    if cached is None or cached[0] != signature:
+        info = load_tile_info(map_type)
+        if info is None:
+            return None
+        info.pop("tiles", None)
+        cached = (signature, info)
+        _tile_info[map_type] = cached
+    return cached[1]
 
 @router.get("/map/{map_type}")
-async def get_map(map_type: str):
-    file_path = os.path.join(MAPS_DIR, f"{map_type}_map.png")
-    return FileResponse(file_path) if os.path.exists(file_path) else JSONResponse({"error": "Map not found"}, status_code=404)
+async def get_map(map_type: str, request: Request):
+    # PNGs are already compressed, so they are cached as they are
+    entry = await run_blocking(load_entry, os.path.join(MAPS_DIR, f"{map_type}_map.png"), "image/png")
+    return cached_response(request, entry) if entry is not None else JSONResponse({"error": "Map not found"}, status_code=404)
+
+@router.get("/map/{map_type}/tiles.json")
+async def get_tiles_info(map_type: str):
+    """
+    Tile pyramid layout of a map ("base" for the base map): size, tile size and zoom range.
+    """
+    info = await run_blocking(get_tile_info, map_type)
+    if info is None:
+        return JSONResponse({"error": "Tiles not found"}, status_code=404)
+    return JSONResponse(content={
+        "width": info["width"],
+        "height": info["height"],
+        "tile_size": info["tile_size"],
+        "min_zoom": 0,
+        "max_zoom": info["max_zoom"],
+    })
+
+@router.get("/map/{map_type}/regions.geojson")
+async def get_region_geojson(map_type: str, request: Request):
+    """
+    Region polygons of a map mode as GeoJSON (map pixel coordinates, y down).
+    """
+    entry = await run_blocking(load_entry, os.path.join(VECTORS_DIR, f"{map_type}.geojson"), "application/geo+json", compress=True)
+    return cached_response(request, entry) if entry is not None else JSONResponse({"error": "Vectors not found"}, status_code=404)
+
+@router.get("/map/{map_type}/regions.svg")
+async def get_region_svg(map_type: str, request: Request):
+    entry = await run_blocking(load_entry, os.path.join(VECTORS_DIR, f"{map_type}.svg"), "image/svg+xml", compress=True)
+    return cached_response(request, entry) if entry is not None else JSONResponse({"error": "Vectors not found"}, status_code=404)
+
+@router.get("/map/{map_type}/regions/version")
+async def get_regions_version(map_type: str):
+    """
+    Version of the region images currently published for a mode, and the versions kept for rollback.
+    The version changes with every regeneration of the mode, so clients can use it to cache-bust.
+    """
+    link_path = os.path.join(REGIONS_DIR, map_type)
+    version = await run_blocking(current_version, link_path)
+    if version is None:
+        return JSONResponse({"error": "Regions not found"}, status_code=404)
+    return JSONResponse(
+        content={"mode": map_type, "version": version, "versions": await run_blocking(list_versions, link_path)},
+        headers={"Cache-Control": "no-cache"},
+    )
+
+@router.get("/map/{map_type}/tiles/{z}/{x}/{y}.png")
+async def get_tile(map_type: str, z: int, x: int, y: int):
+    info = await run_blocking(get_tile_info, map_type)
+    if info is None:
+        return JSONResponse({"error": "Tiles not found"}, status_code=404)
+
+    # Number of tiles per axis at this zoom level
+    scale = 2 ** (info["max_zoom"] - z) if 0 <= z <= info["max_zoom"] else 0
+    columns = -(-info["width"] // (scale * info["tile_size"])) if scale else 0
+    rows = -(-info["height"] // (scale * info["tile_size"])) if scale else 0
+    if not (0 <= x < columns and 0 <= y < rows):
+        return JSONResponse({"error": "Tile out of range"}, status_code=404)
+
+    file_path = tile_path(map_type, z, x, y)
+    if os.path.exists(file_path):
+        return FileResponse(file_path, media_type="image/png")
+    return Response(content=EMPTY_TILE, media_type="image/png")
 
 @router.get("/map")
-async def get_base_map():
-    file_path = os.path.join(INPUTS_DIR, "map.png")
-    return FileResponse(file_path) if os.path.exists(file_path) else JSONResponse({"error": "Map not found"}, status_code=404)
+async def get_base_map(request: Request):
+    entry = await run_blocking(load_entry, os.path.join(INPUTS_DIR, "map.png"), "image/png")
+    return cached_response(request, entry) if entry is not None else JSONResponse({"error": "Map not found"}, status_code=404)
 
 @router.get("/map/province/{coords}")
 async def get_province(coords: str):
     try:
-        start = time.time()
-        # 2. Parse coordinates
+        # Parse coordinates
         x_str, z_str = coords.split(",")
         x, z = int(x_str), int(z_str)
-        province_id = find_province(x, z)
-
-        if province_id == 0:
-            return JSONResponse(
-                content={
-                        "province_id": 0,
-                    },
-                status_code=404,
-            )
-        duration = time.time() - start
-        print(f"Province lookup took {duration:.3f} seconds")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid coordinates format. Use x,z")
+
+    try:
+        province_id = await run_blocking(find_province, x, z)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+    if province_id == 0:
         return JSONResponse(
             content={
-                "province_id": province_id,
-            }
+                "province_id": 0,
+            },
+            status_code=404,
         )
+    return JSONResponse(
+        content={
+            "province_id": province_id,
+        }
+    )
 
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid coordinates format. Use x,z")
+def parse_pair(coord):
+    """
+    An "x,z" string or an [x, z] list as a pair of ints. Anything else (floats, booleans,
+    other lengths) raises ValueError instead of being rounded into a different pixel.
+    """
+    if isinstance(coord, str):
+        pair = tuple(int(part) for part in coord.split(","))
+    elif isinstance(coord, list) and all(isinstance(v, int) and not isinstance(v, bool) for v in coord):
+        pair = tuple(coord)
+    else:
+        raise ValueError
+    if len(pair) != 2:
+        raise ValueError
+    return pair
+
+@router.post("/map/provinces")
+async def get_provinces(request: Request):
+    """
+    Batch lookup. Body: {"coords": [[x, z], [x, z], ...]} (or "x,z" strings).
+    Returns {"province_ids": [...]} in the same order, with 0 for no province or out of bounds.
+    """
+    try:
+        payload = await read_json_body(request)
+        coords = payload["coords"] if isinstance(payload, dict) else payload
+        if not isinstance(coords, list):
+            raise ValueError
+        pairs = [parse_pair(c) for c in coords]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail='Invalid body. Use {"coords": [[x, z], ...]}')
+
+    try:
+        province_ids = await run_blocking(find_provinces, pairs)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+    return JSONResponse(content={"province_ids": province_ids})
@@ -0,0 +1,56 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.scripts.util.adjacency import get_neighbors, adjacency_graph
+from src.scripts.util.geometry import get_province_geometry, get_region_geometry
+from src.scripts.util.hierarchy import get_hierarchy
+from src.scripts.util.worker_pool import run_blocking
+
+router = APIRouter()
+
+@router.get("/provinces/graph")
+async def get_province_graph():
+    """
+    The whole adjacency graph: {"version", "edges": [[a, b, border length], ...], "coast": [[id, coast length], ...]}.
+    """
+    return JSONResponse(content=await run_blocking(adjacency_graph))
+
+def province_exists(province_id):
+    # Memoized per version of the defines, so a lookup does not parse provinces.txt again
+    return province_id in get_hierarchy().province_rgbs
+
+@router.get("/province/{province_id}/neighbors")
+async def get_province_neighbors(province_id: int):
+    if not await run_blocking(province_exists, province_id):
+        return JSONResponse(content={"error": "Province not found"}, status_code=404)
+
+    adjacency = await run_blocking(get_neighbors, province_id)
+    return JSONResponse(content={
+        "province_id": province_id,
+        "coast": adjacency["coast"],
+        "void_border": adjacency["void_border"],
+        "neighbors": [
+            {"province_id": neighbor, "border_length": length}
+            for neighbor, length in sorted(adjacency["neighbors"].items())
+        ],
+    })
+
+@router.get("/province/{province_id}")
+async def get_province_info(province_id: int):
+    """
+    Pixel area, bounding box, centroid (map pixels) and island count of a province.
+    """
+    geometry = await run_blocking(get_province_geometry, province_id)
+    if geometry is None:
+        return JSONResponse(content={"error": "Province not found"}, status_code=404)
+    return JSONResponse(content=dict(geometry, province_id=province_id))
+
+@router.get("/region/{mode}/{region_id}")
+async def get_region_info(mode: str, region_id: str):
+    """
+    Geometry of a county, duchy, kingdom, empire or nation (e.g. /region/county/COUNTY_1),
+    measured on its mode's map, with the provinces painted in its colour.
+    """
+    geometry = await run_blocking(get_region_geometry, mode, region_id)
+    if geometry is None:
+        return JSONResponse(content={"error": "Region not found"}, status_code=404)
+    return JSONResponse(content=geometry)
@@ -1,33 +1,78 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from src.scripts.util.auth import HASHED_KEY
-from src.scripts.util.regeneration import run_regeneration
+from src.scripts.util.regen_jobs import submit_regeneration, get_job, list_jobs, cancel_job
+from src.scripts.util.response_cache import bump_version
+from src.scripts.util.hierarchy import MODE_TITLES
+from src.scripts.util.snapshots import list_versions
 from src.scripts.util.task_lock import regen_lock
-
-import concurrent.futures
+from src.scripts.util.worker_pool import run_blocking
+from src.scripts.mapgen.regiongen import REGIONS_DIR, activate_regions
+import os
 
 router = APIRouter()
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # Optional: tune this if needed
 
-@router.get("/{hashed_key}/api/regenerate/{regen_type}")
-async def regenerate_map(
-    hashed_key: str,
-    regen_type: str,
-    background_tasks: BackgroundTasks
-):
+def check_key(hashed_key):
     if hashed_key != HASHED_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    if regen_lock.locked():
-        raise HTTPException(status_code=429, detail="Regeneration already in progress.")
+@router.get("/{hashed_key}/api/regenerate/{regen_type}")
+async def regenerate_map(hashed_key: str, regen_type: str):
+    check_key(hashed_key)
 
-    background_tasks.add_task(run_regeneration, regen_type)
+    # A request made while another one is still waiting to start joins that job
+    job, merged = submit_regeneration(regen_type)
 
     return JSONResponse(content={
         "success": True,
-        "regen_type": regen_type,
-        "message": f"{'Queued' if regen_type != 'fullregen' else 'Full'} regeneration started."
+        "regen_type": job.regen_type,
+        "job_id": job.id,
+        "merged": merged,
+        "message": f"{'Queued' if job.regen_type != 'fullregen' else 'Full'} regeneration {'merged into a pending job' if merged else 'scheduled'}."
     })
 
+@router.get("/{hashed_key}/api/jobs")
+async def get_jobs(hashed_key: str):
+    check_key(hashed_key)
+    return JSONResponse(content={"jobs": list_jobs()})
+
+@router.get("/{hashed_key}/api/jobs/{job_id}")
+async def get_job_status(hashed_key: str, job_id: str):
+    """
+    Status of a regeneration job: status, stage, current mode and regions done per mode.
+    """
+    check_key(hashed_key)
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=job)
 
+@router.post("/{hashed_key}/api/jobs/{job_id}/cancel")
+async def cancel_job_route(hashed_key: str, job_id: str):
+    check_key(hashed_key)
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in ("done", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return JSONResponse(content=job)
 
+@router.post("/{hashed_key}/api/regions/{mode}/rollback/{version}")
+async def rollback_regions(hashed_key: str, mode: str, version: str):
+    """
+    Publishes one of the kept snapshots of a mode's region images again.
+    """
+    check_key(hashed_key)
+    if mode not in MODE_TITLES:
+        raise HTTPException(status_code=404, detail="Mode not found")
+    if version not in await run_blocking(list_versions, os.path.join(REGIONS_DIR, mode)):
+        raise HTTPException(status_code=404, detail="Version not found")
+    # A regeneration would publish its own snapshot over the rollback
+    if not regen_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A regeneration is running")
+    try:
+        await run_blocking(activate_regions, mode, version, True)
+    finally:
+        regen_lock.release()
+        bump_version()
+    return JSONResponse(content={"success": True, "mode": mode, "version": version})
@@ -1,5 +1,16 @@
 from PIL import Image
+import numpy as np
+import hashlib
+import io
 import os
+from ..util.publish import publish_file, save_image
+
+INPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "input", "banner")
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output", "banner")
+# Rendered banners named by the hash of what they show (see banner_key)
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "banners")
+
+BASE_WIDTH, BASE_HEIGHT = 20, 40
 
 minecraft_dye_colors = {
     "white":     (255, 255, 255),
@@ -20,44 +31,142 @@ minecraft_dye_colors = {
     "black":     (25, 25, 25),
 }
 
-def create_banner(mode, id, patterns, scale_factor=10):
-    input_dir = os.path.join(os.path.dirname(__file__), "..", "..", "input", "banner")
-    output_dir = os.path.join(os.path.dirname(__file__), "..", "..", "output", "banner", mode)
-    os.makedirs(output_dir, exist_ok=True)
+# Pattern path -> (modification time, opaque mask, intensity), decoded once per file version
+_pattern_cache = {}
+
+def load_pattern(ppath, base_width=20, base_height=40):
+    """
+    Decodes a pattern texture into the mask of its opaque pixels and the intensity of each pixel
+    (the banner sits at offset (1, 1) in the texture).
+
+    :return: ((base_height, base_width) boolean mask, (base_height, base_width) float intensity array)
+    """
+    mtime = os.path.getmtime(ppath)
+    cached = _pattern_cache.get(ppath)
+    if cached is None or cached[0] != mtime:
+        pixels = np.asarray(Image.open(ppath).convert("RGBA"))[1:base_height + 1, 1:base_width + 1]
+        intensity = pixels[..., 0] / 255.0  # assume grayscale
+        cached = (mtime, pixels[..., 3] != 0, intensity)
+        _pattern_cache[ppath] = cached
+    return cached[1], cached[2]
 
-    base_width, base_height = 20, 40
-    width, height = base_width * scale_factor, base_height * scale_factor
+# (modification time of input/banner, names of its pattern textures)
+_pattern_names = None
 
-    new_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-    new_img_data = new_img.load()
+def pattern_names():
+    """
+    Names of the pattern textures in input/banner, lowercase and without ".png" (e.g. "cross").
+    Only these names are ever turned into a path.
+    """
+    global _pattern_names
 
+    mtime = os.path.getmtime(INPUT_DIR)
+    if _pattern_names is None or _pattern_names[0] != mtime:
+        names = frozenset(file_name[:-4] for file_name in os.listdir(INPUT_DIR) if file_name.endswith(".png"))
+        _pattern_names = (mtime, names)
+    return _pattern_names[1]
+
+def normalize_patterns(patterns):
+    """
+    Resolves "color.pattern" entries into the layers that are actually drawn: the dye colour
+    (white when unknown) and the path of the pattern texture. Entries without a texture are dropped.
+
+    :return: List of (dye RGB, pattern path), bottom layer first
+    """
+    layers = []
     for entry in patterns:
         color = entry.split('.')[0].lower()
         pattern = entry.split('.')[1].lower()
-        ppath = os.path.join(input_dir, f"{pattern}.png")
 
-        if not os.path.isfile(ppath):
+        if pattern not in pattern_names():
             print(f"{pattern} is not a pattern")
             continue
+        ppath = os.path.join(INPUT_DIR, f"{pattern}.png")
+
+        layers.append((minecraft_dye_colors.get(color, (255, 255, 255)), ppath))  # fallback to white
+    return layers
+
+def banner_key(layers, scale_factor):
+    """
+    Content hash of a banner: its layers, the version of every texture it uses and the scale.
+    Two nations with the same banner share one key, and editing a texture changes the key.
+    """
+    digest = hashlib.sha256(f"{BASE_WIDTH}x{BASE_HEIGHT}@{scale_factor}".encode())
+    for dye_rgb, ppath in layers:
+        st = os.stat(ppath)
+        digest.update(f"|{dye_rgb}:{os.path.basename(ppath)}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return digest.hexdigest()[:32]
 
-        dye_rgb = minecraft_dye_colors.get(color, (255, 255, 255))  # fallback to white
-        pimage = Image.open(ppath).convert("RGBA").load()
+def render_banner(layers, scale_factor=10):
+    """
+    Composites the layers of a banner.
 
-        for y in range(base_height):
-            for x in range(base_width):
-                px = pimage[x + 1, y + 1]
-                if px[3] == 0:
-                    continue
+    :param layers: Output of normalize_patterns
+    :return: (BASE_HEIGHT * scale_factor, BASE_WIDTH * scale_factor, 4) uint8 array
+    """
+    # Layers are composited at base resolution and scaled up once at the end
+    banner = np.zeros((BASE_HEIGHT, BASE_WIDTH, 4), dtype=np.uint8)
 
-                intensity = px[0] / 255.0  # assume grayscale
-                r = int(dye_rgb[0] * intensity)
-                g = int(dye_rgb[1] * intensity)
-                b = int(dye_rgb[2] * intensity)
+    for dye_rgb, ppath in layers:
+        mask, intensity = load_pattern(ppath, BASE_WIDTH, BASE_HEIGHT)
 
-                # Fill the scaled area with the color
-                for dy in range(scale_factor):
-                    for dx in range(scale_factor):
-                        new_img_data[x * scale_factor + dx, y * scale_factor + dy] = (r, g, b)
+        # Same truncation as int(dye * intensity) per channel
+        tinted = (np.array(dye_rgb, dtype=np.float64) * intensity[..., None]).astype(np.uint8)
+        banner[mask, :3] = tinted[mask]
+        banner[mask, 3] = 255
+
+    return np.repeat(np.repeat(banner, scale_factor, axis=0), scale_factor, axis=1)
+
+def banner_png(patterns, scale_factor=10):
+    """
+    Renders a banner straight to PNG bytes, without touching the banner cache.
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(render_banner(normalize_patterns(patterns), scale_factor)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def banner_pngs(banners, scale_factor=10):
+    """
+    Renders several banners to PNG bytes, so a worker process gets a whole chunk of a batch per task.
+    """
+    return [banner_png(patterns, scale_factor) for patterns in banners]
+
+def cached_banner(patterns, scale_factor=10):
+    """
+    Path of the rendered banner in the banner cache, rendering it only if no banner with the
+    same key was rendered before.
+
+    :return: (cache path, whether the banner had to be rendered)
+    """
+    layers = normalize_patterns(patterns)
+    path = os.path.join(CACHE_DIR, f"{banner_key(layers, scale_factor)}.png")
+    if os.path.exists(path):
+        return path, False
+
+    save_image(Image.fromarray(render_banner(layers, scale_factor)), path)
+    return path, True
+
+def prune_banner_cache(used_paths):
+    """
+    Removes cached banners that are not in used_paths. Published banners are hard links, so they
+    keep their content.
+    """
+    used = {os.path.basename(path) for path in used_paths}
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for file_name in os.listdir(CACHE_DIR):
+        if file_name not in used:
+            try:
+                os.remove(os.path.join(CACHE_DIR, file_name))
+            except OSError:
+                pass
+
+def create_banner(mode, id, patterns, scale_factor=10):
+    """
+    Publishes the banner for output/banner/{mode}/{id}.png from the banner cache.
 
-    output_path = os.path.join(output_dir, f"{id}.png")
-    new_img.save(output_path, "PNG")
+    :return: (cache path, whether the banner had to be rendered)
+    """
+    path, rendered = cached_banner(patterns, scale_factor)
+    publish_file(path, os.path.join(OUTPUT_DIR, mode, f"{id}.png"))
+    return path, rendered
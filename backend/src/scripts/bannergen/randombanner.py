@@ -47,8 +47,8 @@ stripe_patterns = [
     "SMALL_STRIPES_HORIZONTAL", "CROSS", "STRAIGHT_CROSS", "BORDER", "CURLY_BORDER"
 ]
 
-# Ornaments – Smaller or iconographic
-ornament_patterns = list(set(pattern_types) - set(background_patterns) - set(stripe_patterns))
+# Ornaments – Smaller or iconographic (sorted, since set order changes between processes and seeded banners must not)
+ornament_patterns = sorted(set(pattern_types) - set(background_patterns) - set(stripe_patterns))
 
 minecraft_dye_colors = {
     "white":     (255, 255, 255),
@@ -69,7 +69,7 @@ minecraft_dye_colors = {
 def color_distance(c1, c2):
     return sum((a - b) ** 2 for a, b in zip(c1, c2)) ** 0.5
 
-def get_contrasting_color(used_colors, all_colors, dye_rgb_map):
+def get_contrasting_color(used_colors, all_colors, dye_rgb_map, rng=random):
     threshold = 100  # Higher = stronger contrast
 
     contrasting = [
@@ -78,13 +78,13 @@ def get_contrasting_color(used_colors, all_colors, dye_rgb_map):
     ]
 
     if contrasting:
-        return random.choice(contrasting)
+        return rng.choice(contrasting)
     else:
         # fallback to any unused color
         unused = [c for c in all_colors if c not in used_colors]
-        return random.choice(unused) if unused else random.choice(all_colors)
+        return rng.choice(unused) if unused else rng.choice(all_colors)
 
-def get_similar_color(used_colors, all_colors, dye_rgb_map, threshold=80):
+def get_similar_color(used_colors, all_colors, dye_rgb_map, threshold=80, rng=random):
     color_usage = {color: used_colors.count(color) for color in all_colors}
 
     # Build a weighted list of similar colors with weights decreasing on repeated use
@@ -96,45 +96,48 @@ def get_similar_color(used_colors, all_colors, dye_rgb_map, threshold=80):
             weighted_similar.extend([color] * weight)
 
     if weighted_similar:
-        return random.choice(weighted_similar)
+        return rng.choice(weighted_similar)
     else:
         # fallback to unused or any available color
         unused = [c for c in all_colors if c not in used_colors]
-        return random.choice(unused) if unused else random.choice(all_colors)
+        return rng.choice(unused) if unused else rng.choice(all_colors)
 
-def generate_random_banner():
+def generate_random_banner(rng=random):
+    """
+    Generates a random pattern list. Pass a seeded random.Random as rng to get the same banner every time.
+    """
     used_colors = []
-    base_color = random.choice(dye_colors)
+    base_color = rng.choice(dye_colors)
     used_colors.append(base_color)
     patterns = [f"{base_color}.BASE"]
 
     # Background (80% chance)
-    if random.random() < 0.8:
-        bg_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors)
-        bg_pattern = random.choice(background_patterns)
+    if rng.random() < 0.8:
+        bg_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors, rng=rng)
+        bg_pattern = rng.choice(background_patterns)
         patterns.append(f"{bg_color}.{bg_pattern}")
         used_colors.append(bg_color)
 
     # Stripe (60% chance)
-    if random.random() < 0.6:
-        stripe_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors)
-        stripe_pattern = random.choice(stripe_patterns)
+    if rng.random() < 0.6:
+        stripe_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors, rng=rng)
+        stripe_pattern = rng.choice(stripe_patterns)
         patterns.append(f"{stripe_color}.{stripe_pattern}")
         used_colors.append(stripe_color)
 
     # Ornaments
-    ornament_count = random.choices([1, 2, 3], weights=[60, 30, 10])[0]
+    ornament_count = rng.choices([1, 2, 3], weights=[60, 30, 10])[0]
     used_ornaments = set()
 
     for _ in range(ornament_count):
         while True:
-            ornament = random.choice(ornament_patterns)
+            ornament = rng.choice(ornament_patterns)
             if ornament not in used_ornaments:
                 used_ornaments.add(ornament)
                 break
-        ornament_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors)
-        if random.random() < 0.6 or _ == 0:
-            ornament_color = get_contrasting_color(used_colors, dye_colors, minecraft_dye_colors)
+        ornament_color = get_similar_color(used_colors, dye_colors, minecraft_dye_colors, rng=rng)
+        if rng.random() < 0.6 or _ == 0:
+            ornament_color = get_contrasting_color(used_colors, dye_colors, minecraft_dye_colors, rng=rng)
         patterns.append(f"{ornament_color}.{ornament}")
         used_colors.append(ornament_color)
 
@@ -1,7 +1,8 @@
 from ..loader.nations import load_nations
-from ..bannergen.bannergen import create_banner
+from ..bannergen.bannergen import create_banner, prune_banner_cache
 from ..bannergen.randombanner import generate_random_banner
-from PIL import Image
+from ..util.publish import publish_folder
+from ..util.title_graph import compile_title_graph, report_problems
 import json
 import os
 import re
@@ -24,24 +25,12 @@ def process_nations():
 
     banner_folder = os.path.join(os.path.dirname(__file__), "..", "..", "output", "banner", "nation")
     os.makedirs(banner_folder, exist_ok=True)
-    for file_name in os.listdir(banner_folder):
-        file_path = os.path.join(banner_folder, file_name)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
 
-    # Initialize "subjects" field
     for nation_id, data in nations.items():
         if not isinstance(data, dict):
             print(f"⚠️ Skipping invalid nation entry: {nation_id} (value: {data})")
             continue
-        data.setdefault("subjects", [])
 
-        # If the nation has an overlord, add it to the overlord's "subjects" list
-        if "overlord" in data:
-            overlord_id = data["overlord"]
-            if overlord_id in nations and isinstance(nations[overlord_id], dict):
-                nations[overlord_id].setdefault("subjects", []).append(nation_id)
-        
         # Inside the for nation_id, data in nations.items():
         data["name"] = clean_name(data.get("name", ""))
 
@@ -52,50 +41,41 @@ def process_nations():
         if "banner patterns" in data:
             data["banner patterns"] = clean_banner_patterns(data["banner patterns"])
 
-    # Recursive function to calculate size (provinces + subjects' provinces)
-    def calculate_size(nation_id):
-        nation = nations[nation_id]
-        total_size = len(nation.get("provinces", []))  # Own provinces
-        subject_size = 0
-
-        # Add sizes of all subjects
-        for subject_id in nation.get("subjects", []):
-            subject_size += calculate_size(subject_id)
-            total_size += subject_size
-
-        # Store computed size in the nation
-        nation["size"] = total_size
-        nation["subject_size"] = subject_size
-        return total_size
+    # Overlord links ordered once; cycles and unknown overlords are reported and left out
+    graph = compile_title_graph(nations)
+    report_problems(graph, "Nation")
 
     # Compute sizes for all nations
-    for nation_id in nations:
-        if "size" not in nations[nation_id]:  # Avoid redundant calculations
-            calculate_size(nation_id)
+    banner_files = set()
+    cached_paths = []
+    rendered_count = 0
+    for nation_id in graph["order"]:
         nation = nations[nation_id]
+        # Subjects are listed under their overlord, and size counts the provinces of the whole subtree
+        nation.setdefault("subjects", []).extend(graph["children"][nation_id])
+        nation["size"] = graph["sizes"][nation_id]
+        nation["subject_size"] = graph["subject_sizes"][nation_id]
         if "banner" not in nation:
             nation["banner"] = generate_random_banner()
         rgb = nation["rgb"].split(',')
         id = rgb[0]+"_"+rgb[1]+"_"+rgb[2]
-        create_banner("nation", id, nation["banner"])
+        cached_path, rendered = create_banner("nation", id, nation["banner"])
+        cached_paths.append(cached_path)
+        rendered_count += rendered
+        banner_files.add(f"{id}.png")
         nation["banner"] = id
-    
+    print(f"Banners: {rendered_count} rendered, {len(banner_files) - rendered_count} unchanged")
+    prune_banner_cache(cached_paths)
+
     if True:
         DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", "banners", "nation")
-        os.makedirs(DIR, exist_ok=True)
-        for file_name in os.listdir(DIR):
-            file_path = os.path.join(DIR, file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        # Only banners of nations that no longer exist are removed, the rest are replaced in place
         for file_name in os.listdir(banner_folder):
-            new_image_path = os.path.join(banner_folder, file_name)
-            if os.path.exists(new_image_path):
-                new_img = Image.open(new_image_path).convert("RGBA")
-                frontend_image_path = os.path.join(DIR, f"{file_name}")
-                new_img.save(frontend_image_path, "PNG")
-                print(f"Banner copied for the frontend and saved as {frontend_image_path}")
-            else:
-                print(f"Warning: {new_image_path} not found for frontend copy.")
+            file_path = os.path.join(banner_folder, file_name)
+            if file_name not in banner_files and os.path.isfile(file_path):
+                os.remove(file_path)
+        copied = publish_folder(banner_folder, DIR)
+        print(f"{copied} banners published for the frontend in {DIR}")
 
     # Save modified JSON
     with open(os.path.join(OUTPUT_DIR, "nation.json"), "w", encoding="utf-8") as file:
@@ -0,0 +1,134 @@
+from PIL import Image
+import numpy as np
+import json
+import math
+import os
+from ..util.publish import publish_file, write_file, save_image
+from .regiongen import crop_to_content, load_manifest
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output")
+ATLAS_DIR = os.path.join(OUTPUT_DIR, "atlas")
+FRONTEND_ATLAS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", "atlas")
+
+# Largest atlas page (safe texture size for WebGL); bigger sprites get a page of their own
+MAX_PAGE_SIZE = 4096
+# Transparent pixels between sprites so texture filtering does not bleed
+PADDING = 1
+
+def pack_shelves(sizes, max_size=MAX_PAGE_SIZE, padding=PADDING):
+    """
+    Packs rectangles onto pages in rows ("shelves"), tallest first.
+
+    :param sizes: Name -> (width, height)
+    :return: (name -> (page, x, y), list of (width, height) of every page)
+    """
+    placements = {}
+    pages = []
+    page = None
+
+    # Rows as wide as a square holding every sprite, so pages do not end up as one long strip
+    fitting = [(width + padding) * (height + padding) for width, height in sizes.values() if width <= max_size and height <= max_size]
+    widest = max([width for width, height in sizes.values() if width <= max_size and height <= max_size], default=0)
+    row_width = min(max_size, max(widest, math.ceil(math.sqrt(sum(fitting)))))
+    for name, (width, height) in sorted(sizes.items(), key=lambda item: (-item[1][1], -item[1][0], item[0])):
+        if width > max_size or height > max_size:
+            placements[name] = (len(pages), 0, 0)
+            pages.append([width, height, 0, 0, 0])
+            page = None
+            continue
+
+        if page is not None and page[3] + width > row_width:
+            # New shelf below the current one
+            page[2], page[3], page[4] = page[2] + page[4] + padding, 0, 0
+        if page is None or page[2] + height > max_size:
+            pages.append([0, 0, 0, 0, 0])
+            page = pages[-1]
+
+        # page = [used width, used height, shelf top, shelf x, shelf height]
+        placements[name] = (len(pages) - 1, page[3], page[2])
+        page[3] += width + padding
+        page[4] = max(page[4], height)
+        page[0] = max(page[0], page[3] - padding)
+        page[1] = max(page[1], page[2] + page[4])
+    return placements, [(width, height) for width, height, *_ in pages]
+
+def build_atlas(name, sprites, frontend_save, max_size=MAX_PAGE_SIZE):
+    """
+    Packs sprites into atlas pages output/atlas/{name}_{page}.png and writes output/atlas/{name}.json:
+    {"pages": [{"file", "width", "height"}], "sprites": {sprite: {"page", "x", "y", "width", "height", "uv", ...}}}
+    where uv is [u0, v0, u1, v1] on the page. Extra keys given with a sprite (e.g. its map position) are kept.
+
+    :param sprites: Sprite name -> (RGBA array, dictionary of extra manifest fields)
+    """
+    placements, page_sizes = pack_shelves(
+        {sprite: (pixels.shape[1], pixels.shape[0]) for sprite, (pixels, _) in sprites.items()}, max_size
+    )
+    canvases = [np.zeros((height, width, 4), dtype=np.uint8) for width, height in page_sizes]
+
+    manifest = {"pages": [], "sprites": {}}
+    for sprite in sorted(sprites):
+        pixels, extra = sprites[sprite]
+        page, x, y = placements[sprite]
+        height, width = pixels.shape[:2]
+        canvases[page][y:y + height, x:x + width] = pixels
+        page_width, page_height = page_sizes[page]
+        manifest["sprites"][sprite] = dict(
+            extra,
+            page=page, x=x, y=y, width=width, height=height,
+            uv=[x / page_width, y / page_height, (x + width) / page_width, (y + height) / page_height],
+        )
+
+    for page, canvas in enumerate(canvases):
+        file_name = f"{name}_{page}.png"
+        save_image(Image.fromarray(canvas), os.path.join(ATLAS_DIR, file_name))
+        manifest["pages"].append({"file": file_name, "width": canvas.shape[1], "height": canvas.shape[0]})
+    manifest_path = os.path.join(ATLAS_DIR, f"{name}.json")
+    write_file(manifest_path, json.dumps(manifest, indent=2))
+    print(f"Atlas {name}: {len(sprites)} sprites on {len(canvases)} pages")
+
+    # Pages beyond the new page count are left over from a bigger atlas
+    page_files = {page["file"] for page in manifest["pages"]}
+    folders = [ATLAS_DIR, FRONTEND_ATLAS_DIR] if frontend_save else [ATLAS_DIR]
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+        for file_name in os.listdir(folder):
+            if file_name.startswith(f"{name}_") and file_name.endswith(".png") and file_name not in page_files:
+                os.remove(os.path.join(folder, file_name))
+
+    if frontend_save:
+        for page in manifest["pages"]:
+            publish_file(os.path.join(ATLAS_DIR, page["file"]), os.path.join(FRONTEND_ATLAS_DIR, page["file"]))
+        publish_file(manifest_path, os.path.join(FRONTEND_ATLAS_DIR, f"{name}.json"))
+    return manifest
+
+def build_region_atlas(mode, frontend_save):
+    """
+    Packs every region image of a mode (hover and nested versions included), cropped to content.
+    Each sprite records where it sits on the full map as map_x / map_y.
+    """
+    region_dir = os.path.join(OUTPUT_DIR, "regions", mode)
+    # Regions that were already cropped are placed through their sprite manifest
+    placed = load_manifest(os.path.join(OUTPUT_DIR, "regions", f"{mode}_manifest.json")).get("sprites", {})
+
+    sprites = {}
+    for file_name in sorted(os.listdir(region_dir)):
+        if not file_name.endswith(".png"):
+            continue
+        sprite = file_name[:-4]
+        with Image.open(os.path.join(region_dir, file_name)) as img:
+            pixels, bounds = crop_to_content(np.asarray(img.convert("RGBA")))
+        offset = placed.get(sprite, {"x": 0, "y": 0})
+        sprites[sprite] = (pixels, {"map_x": offset["x"] + bounds["x"], "map_y": offset["y"] + bounds["y"]})
+    return build_atlas(f"regions_{mode}", sprites, frontend_save)
+
+def build_banner_atlas(mode, frontend_save):
+    """
+    Packs the banners of a mode (output/banner/{mode}) into an atlas.
+    """
+    banner_dir = os.path.join(OUTPUT_DIR, "banner", mode)
+    sprites = {}
+    for file_name in sorted(os.listdir(banner_dir)):
+        if file_name.endswith(".png"):
+            with Image.open(os.path.join(banner_dir, file_name)) as img:
+                sprites[file_name[:-4]] = (np.asarray(img.convert("RGBA")), {})
+    return build_atlas(f"banners_{mode}", sprites, frontend_save)
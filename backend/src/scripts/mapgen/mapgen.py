@@ -1,54 +1,110 @@
 from PIL import Image
+import numpy as np
 import os
+from ..loader.provinces import load_provinces
 from ..util.colour_mapping import build_color_mapping
 from ..util.border_paint import paint_borders
-from ..util.flood_fill import flood_fill
 from ..util.colour_mapping import get_color_overrides
+from .tilegen import build_tiles
+from ..util.province_raster import load_province_raster, build_colour_lut, pack_rgb
+from ..util.publish import save_image
+from scipy import ndimage
 
 
-def create_map(mode, filename, frontend_save):
-    # Create a lookup dictionary for province color -> kingdom color
-    province_to_color = build_color_mapping(mode)
-    overrides = get_color_overrides(mode)
-
-    # Open the original province map image
-    image_path = os.path.join(os.path.dirname(__file__), "..", "..", "input", "provinces.png")
-    original_img = Image.open(image_path).convert("RGBA")
-    img_data = original_img.load()
-    width, height = original_img.size
-
-    # Create a new blank image with transparency
-    new_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-    new_img_data = new_img.load()
-
-    # Process each province separately to handle islands
-    visited_pixels = set()
-    for y in range(height):
-        for x in range(width):
-            pixel_color = img_data[x, y][:3]
-            if pixel_color in province_to_color and (x, y) not in visited_pixels:
-                kingdom_color = province_to_color[pixel_color]
-                flood_fill(x, y, pixel_color, kingdom_color, visited_pixels, img_data, new_img_data, width, height)
+def apply_overrides(new_pixels, labels, overrides, provinces):
+    """
+    Recolours the connected areas that start on a province whose own colour is overridden.
+    Seeds are handled in scan order (top to bottom, left to right) and a filled area is never
+    filled twice, so chained overrides resolve the same way as the old per-pixel flood fill.
+    """
+    seed_lut = np.zeros(max(provinces.values(), default=0) + 1, dtype=np.uint32)
+    for pixel_color in overrides:
+        province_id = provinces.get(pixel_color)
+        if province_id is not None:
+            seed_lut[province_id] = pack_rgb(pixel_color) | (1 << 24)
+
+    seed_keys = seed_lut[labels].ravel()
+    seed_index = np.flatnonzero(seed_keys)
+    seed_keys = seed_keys[seed_index] & 0xFFFFFF
+    visited = np.zeros(labels.shape, dtype=bool)
+
+    start = 0
+    while start < len(seed_index):
+        current = pack_rgb(new_pixels[..., :3])
+        pending = seed_index[start:]
+        ready = (current.ravel()[pending] == seed_keys[start:]) & ~visited.ravel()[pending]
+        if not ready.any():
+            break
+        start += int(np.argmax(ready))
+        key = int(seed_keys[start])
+        pixel_color = ((key >> 16) & 255, (key >> 8) & 255, key & 255)
+
+        components, _ = ndimage.label((current == key) & ~visited)
+        area = components == components.flat[seed_index[start]]
+        new_pixels[area] = overrides[pixel_color] + (255,)
+        visited |= area
+        start += 1
+    return new_pixels
+
+
+def render_mode_maps(modes, labels, provinces, band_height=256):
+    """
+    Recolours the province raster for several modes in a single pass.
+    The raster is read one band of rows at a time and every mode is painted from that band
+    while it is still in cache, so the map is traversed once no matter how many modes are rendered.
+
+    :return: One (height, width, 4) RGBA array per mode, in the order of modes
+    """
+    luts = [build_colour_lut(build_color_mapping(mode), provinces) for mode in modes]
+    height, width = labels.shape
+    maps = [np.empty((height, width, 4), dtype=np.uint8) for _ in modes]
+
+    for top in range(0, height, band_height):
+        band = np.asarray(labels[top:top + band_height])
+        for lut, new_pixels in zip(luts, maps):
+            np.take(lut, band, axis=0, out=new_pixels[top:top + band_height])
+    return maps
+
 
+def save_map(mode, filename, new_pixels, labels, provinces, frontend_save):
+    """
+    Saves a recoloured map for the frontend, then paints borders and overlord overrides for the backend copy.
+    """
     if frontend_save:
         frontend_image_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", f"{filename}.png")
-        os.makedirs(os.path.dirname(frontend_image_path), exist_ok=True)
-        new_img.save(frontend_image_path, "PNG")
-        print(f"New image generated for the frontend and saved as {frontend_image_path}")
+        # Written only if the encoded map differs from the one already published
+        if save_image(Image.fromarray(new_pixels), frontend_image_path):
+            print(f"New image generated for the frontend and saved as {frontend_image_path}")
 
-    new_img_data = paint_borders(True, True, new_img_data, width, height)
-
-    visited_pixels = set()
-    for y in range(height):
-        for x in range(width):
-            pixel_color = img_data[x, y][:3]
-            if pixel_color in overrides and (x, y) not in visited_pixels:
-                color = overrides[pixel_color]
-                flood_fill(x, y, pixel_color, color, visited_pixels, new_img_data, new_img_data, width, height)
+    paint_borders(True, True, new_pixels)
+    apply_overrides(new_pixels, labels, get_color_overrides(mode), provinces)
 
     # Save the new image
     new_image_path = os.path.join(os.path.dirname(__file__), "..", "..", "output", "maps", f"{filename}.png")
-    os.makedirs(os.path.dirname(new_image_path), exist_ok=True)
-    new_img.save(new_image_path, "PNG")
+    save_image(Image.fromarray(new_pixels), new_image_path)
 
     print(f"New image generated for the backend and saved as {new_image_path}")
+
+    # Only the tiles whose pixels changed are encoded again
+    build_tiles(mode, Image.fromarray(new_pixels))
+
+
+def create_maps(modes, frontend_save):
+    """
+    Generates the {mode}_map images of several modes from one traversal of the province raster.
+    """
+    # Province ID of every pixel (decoded from provinces.png only when it changed)
+    provinces = load_provinces()
+    labels = load_province_raster()
+
+    for mode, new_pixels in zip(modes, render_mode_maps(modes, labels, provinces)):
+        save_map(mode, f"{mode}_map", new_pixels, labels, provinces, frontend_save)
+
+
+def create_map(mode, filename, frontend_save):
+    provinces = load_provinces()
+    labels = load_province_raster()
+
+    # Paint every province with its region colour in one lookup (islands included)
+    new_pixels = render_mode_maps([mode], labels, provinces)[0]
+    save_map(mode, filename, new_pixels, labels, provinces, frontend_save)
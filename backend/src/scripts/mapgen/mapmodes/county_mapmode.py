@@ -1,7 +1,7 @@
 from ..mapgen import create_map
 from ..regiongen import generate_regions
 
-create_map("county", "county_map", True)
-generate_regions("county", True, True)
-
-
+# Guarded: the region workers import the main module again when they start
+if __name__ == "__main__":
+    create_map("county", "county_map", True)
+    generate_regions("county", True, True)
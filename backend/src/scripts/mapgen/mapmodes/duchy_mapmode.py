@@ -1,5 +1,7 @@
 from ..mapgen import create_map
 from ..regiongen import generate_regions
 
-create_map("duchy", "duchy_map", True)
-generate_regions("duchy", True, True)
\ No newline at end of file
+# Guarded: the region workers import the main module again when they start
+if __name__ == "__main__":
+    create_map("duchy", "duchy_map", True)
+    generate_regions("duchy", True, True)
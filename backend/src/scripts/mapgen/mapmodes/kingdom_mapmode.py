@@ -1,5 +1,7 @@
 from ..mapgen import create_map
 from ..regiongen import generate_regions
 
-create_map("kingdom", "kingdom_map", True)
-generate_regions("kingdom", True, True)
\ No newline at end of file
+# Guarded: the region workers import the main module again when they start
+if __name__ == "__main__":
+    create_map("kingdom", "kingdom_map", True)
+    generate_regions("kingdom", True, True)
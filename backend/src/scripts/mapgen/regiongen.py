@@ -1,9 +1,24 @@
 from PIL import Image, ImageEnhance
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import json
 import os
-from ..util.border_paint import paint_borders
-from ..util.flood_fill import flood_fill
+from ..util.border_paint import border_mask, border_color, border_thickness
 from ..util.colour_mapping import build_color_mapping
 from ..util.colour_mapping import get_color_overrides
+from ..util.province_raster import load_province_raster, pixel_index_paths, open_cached_array
+from ..loader.provinces import load_provinces
+from ..util.publish import publish_file, publish_folder, write_file, save_image
+from ..util.snapshots import create_snapshot, activate_snapshot, discard_snapshot, list_versions, snapshot_root
+
+REGIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output", "regions")
+FRONTEND_REGIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", "regions")
+# Copy of the sprite manifest kept inside each snapshot, so a rollback restores the matching manifest
+SNAPSHOT_MANIFEST = "manifest.json"
+# Render workers are started from a clean server process instead of forking the API process,
+# whose threads may hold locks at fork time (spawn where forkserver is not available)
+WORKER_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
 
 def is_overlord(rgb_tuple, overrides):
     """
@@ -21,81 +36,179 @@ def sanitize_filename(color_tuple):
     """
     return "_".join(map(str, color_tuple)).replace("(", "").replace(")", "").replace(",", "").replace(" ", "")
 
-def draw(x, y, new_img, new_image_path, pixel_color, color, visited_pixels, img_data, width, height, painted_colour, overrides, output_folder, first):
+def collect_layers(province_to_color, provinces, overrides, queued=None):
     """
-    Fills and saves an image for a region.
+    Works out which provinces are painted into which region image.
+    A province is painted into its own region, into the region's _nested image if the region is an
+    overlord, and into the image of every overlord above it.
+
+    :param queued: Only regions whose file name is in this set are collected (None for all)
+    :return: A dictionary of file base name -> (RGB colour, list of province IDs)
     """
-    try:
-        new_img_data = new_img.load()
-        flood_fill(x, y, pixel_color, color, visited_pixels, img_data, new_img_data, width, height)
-        painted_colour.add(color)
-        new_img.save(new_image_path, "PNG")
-        if is_overlord(color, overrides) and first:
-            nested_filename = sanitize_filename(color) + "_nested.png"
-            nested_image_path = os.path.join(output_folder, nested_filename)
-            nested_img = None
-            if not os.path.exists(nested_image_path):
-                nested_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))  # Transparent image
-                print(f"New overlord nested image saved: {nested_image_path}")
-            else:
-                nested_img = Image.open(nested_image_path)
-                print(f"Edited nested Overlord: {nested_image_path}")
-            nested_img_data = nested_img.load()
-            flood_fill(x, y, pixel_color, color, set(), img_data, nested_img_data, width, height)
-            nested_img.save(nested_image_path, "PNG")
-        if color in overrides:
-            overlord_color = overrides[color]
-            overlord_filename = sanitize_filename(overlord_color) + ".png"
-            overlord_image_path = os.path.join(output_folder, overlord_filename)
-            if overlord_color not in painted_colour:
-                overlord_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))  # Transparent image
-                draw(x, y, overlord_img, overlord_image_path, pixel_color, overlord_color, set(), img_data, width, height, painted_colour, overrides, output_folder, False)
-                print(f"New overlord image saved: {new_image_path}")
-            else:
-                overlord_img = Image.open(overlord_image_path)
-                draw(x, y, overlord_img, overlord_image_path, pixel_color, overlord_color, set(), img_data, width, height, painted_colour, overrides, output_folder, False)
-                print(f"Edited Overlord: {new_image_path}")
-
-    except Exception as e:
-        print(f"Error saving {new_image_path}: {e}")
-
-def lighten_image(image_path, hover_image_path):
-    """
-    Opens an image, increases brightness, and saves it as a hover version.
+    layers = {}
+
+    def add(name, color, province_id):
+        layers.setdefault(name, (color, []))[1].append(province_id)
+
+    for province_rgb, color in province_to_color.items():
+        province_id = provinces[province_rgb]
+        name = sanitize_filename(color)
+        if queued is not None and name not in queued:
+            continue
+        add(name, color, province_id)
+        if is_overlord(color, overrides):
+            add(name + "_nested", color, province_id)
+
+        # Walk up the overlord chain (guarding against cycles)
+        chain = {color}
+        while color in overrides and overrides[color] not in chain:
+            color = overrides[color]
+            chain.add(color)
+            add(sanitize_filename(color), color, province_id)
+    return layers
+
+def render_layer(color, province_ids, pixel_index, shape, padding=0):
     """
-    try:
-        img = Image.open(image_path).convert("RGBA")
-        enhancer = ImageEnhance.Brightness(img)
-        lighter_img = enhancer.enhance(1.4)  # Increase brightness by 40%
-        lighter_img.save(hover_image_path, "PNG")
-        print(f"Lightened image: {hover_image_path}")
-    except Exception as e:
-        print(f"Error lightening image {hover_image_path}: {e}")
+    Paints the given provinces in one colour onto a transparent canvas that only covers their
+    bounding box, grown by padding pixels on every side (clipped to the map).
 
+    :param pixel_index: The (order, starts) province pixel index of the raster
+    :param shape: (height, width) of the full map
+    :return: The RGBA array and its (top, left) position on the map, or (None, None) if none of the provinces has pixels
+    """
+    order, starts = pixel_index
+    pixels = np.concatenate([order[starts[p]:starts[p + 1]] for p in province_ids if p + 1 < len(starts)] or [order[:0]])
+    if len(pixels) == 0:
+        return None, None
 
-def generate_regions(mode, borders, frontend_save, queued_regen=False):
+    height, width = shape
+    rows, cols = np.divmod(pixels.astype(np.int64), width)
+    top, left = max(int(rows.min()) - padding, 0), max(int(cols.min()) - padding, 0)
+    bottom, right = min(int(rows.max()) + 1 + padding, height), min(int(cols.max()) + 1 + padding, width)
+
+    new_pixels = np.zeros((bottom - top, right - left, 4), dtype=np.uint8)
+    new_pixels[rows - top, cols - left] = color + (255,)
+    return new_pixels, (top, left)
+
+def brightness_lut(factor):
     """
-    Generate separate images for each region (county, duchy, kingdom).
+    Builds a per-channel lookup table that gives the same result as ImageEnhance.Brightness(factor).
+    """
+    ramp = np.repeat(np.arange(256, dtype=np.uint8)[None, :, None], 3, axis=2)
+    lighter = np.asarray(ImageEnhance.Brightness(Image.fromarray(ramp)).enhance(factor))
+    return lighter[0, :, 0].copy()
+
+# Increase brightness by 40% for the hover versions
+HOVER_LUT = brightness_lut(1.4)
+
+def lighten(pixels):
+    """
+    Returns a hover version of an RGBA array with the brightness increased (alpha is kept).
+    """
+    hover_pixels = pixels.copy()
+    hover_pixels[..., :3] = HOVER_LUT[pixels[..., :3]]
+    return hover_pixels
+
+def crop_to_content(pixels):
+    """
+    Crops an RGBA array to the bounding box of its non-transparent pixels.
+
+    :param pixels: A (height, width, 4) RGBA array
+    :return: The cropped array and its placement on the full canvas as {"x", "y", "width", "height"}
+    """
+    opaque = pixels[..., 3] != 0
+    rows = np.flatnonzero(opaque.any(axis=1))
+    cols = np.flatnonzero(opaque.any(axis=0))
+    if len(rows) == 0:
+        top, bottom, left, right = 0, 1, 0, 1
+    else:
+        top, bottom, left, right = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    sprite = {"x": left, "y": top, "width": right - left, "height": bottom - top}
+    return pixels[top:bottom, left:right], sprite
+
+def load_manifest(manifest_path):
+    """
+    Loads a sprite manifest, or returns an empty one if it does not exist yet.
+    """
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"sprites": {}}
+
+def render_region(job):
+    """
+    Renders one region image with its hover version, paints borders, crops and saves both.
+    Runs in a worker process: the province pixel index is memory-mapped from the raster cache,
+    so only the job description is sent to the worker.
+
+    :param job: A dictionary with name, color, province_ids, index_paths, shape, output_folder, borders and cropped
+    :return: The sprite placement of every saved file (empty unless cropped)
+    """
+    pixel_index = tuple(open_cached_array(path) for path in job["index_paths"])
+    padding = border_thickness + 1 if job["borders"] else 0
+    new_pixels, origin = render_layer(job["color"], job["province_ids"], pixel_index, job["shape"], padding)
+    if new_pixels is None:
+        # None of the region's provinces is painted on the map
+        return {}
+    top, left = origin
+
+    # Hover version comes from the same buffer, and both share one border mask
+    hover_pixels = lighten(new_pixels)
+    if job["borders"]:
+        mask = border_mask(new_pixels, between=False)
+        new_pixels[mask] = border_color
+        hover_pixels[mask] = border_color
+
+    if job["cropped"]:
+        new_pixels, bounds = crop_to_content(new_pixels)
+        hover_pixels = hover_pixels[bounds["y"]:bounds["y"] + bounds["height"], bounds["x"]:bounds["x"] + bounds["width"]]
+        sprite = dict(bounds, x=bounds["x"] + left, y=bounds["y"] + top)
+
+    sprites = {}
+    for file_name, image_pixels in ((job["name"], new_pixels), (job["name"] + "_hover", hover_pixels)):
+        if job["cropped"]:
+            sprites[file_name] = sprite
+        else:
+            canvas = np.zeros(job["shape"] + (4,), dtype=np.uint8)
+            canvas[top:top + image_pixels.shape[0], left:left + image_pixels.shape[1]] = image_pixels
+            image_pixels = canvas
+        new_image_path = os.path.join(job["output_folder"], file_name + ".png")
+        # Replaced, never rewritten in place: the file may be a hard link into an older snapshot
+        save_image(Image.fromarray(image_pixels), new_image_path)
+        print(f"New image saved: {new_image_path}")
+    return sprites
+
+def prepare_regions(mode, borders, queued_regen, cropped):
+    """
+    Clears the outdated images of a mode and lists the region images to render.
+
+    :return: The mode's render state: output folder, manifest and one job per region image
     """
-    # Load province map
-    image_path = os.path.join(os.path.dirname(__file__), "..", "..", "input", "provinces.png")
-    original_img = Image.open(image_path).convert("RGBA")
-    img_data = original_img.load()
-    width, height = original_img.size
+    # Province ID of every pixel, and the cached pixel index shared with the workers
+    labels = load_province_raster()
+    index_paths = pixel_index_paths()
+    height, width = labels.shape
 
     # Load color mappings for mode (county, duchy, kingdom)
     province_to_color = build_color_mapping(mode)
     overrides = get_color_overrides(mode)
 
-    # Create output folder
-    output_folder = os.path.join(os.path.dirname(__file__), "..", "..", "output", "regions", mode)
-    os.makedirs(output_folder, exist_ok=True)
+    manifest_path = os.path.join(REGIONS_DIR, f"{mode}_manifest.json")
+    manifest = load_manifest(manifest_path) if cropped and queued_regen else {"sprites": {}}
+    queued = None
     if queued_regen:
-        from ..util.queue import load_queue, compile_queue
-        compile_queue()
-        queue = load_queue(mode)
+        from ..util.queue import take_queue
+        queue = take_queue(mode)
         print(queue)
         queued = set(queue)
+
+    # Work out the provinces of every region, overlord and nested image
+    layers = collect_layers(province_to_color, load_provinces(), overrides, queued)
+
+    # Images are rendered into a new snapshot of output/regions/{mode}, which is only published once complete.
+    # A queued regeneration starts from the current images and replaces the queued ones.
+    output_folder = create_snapshot(os.path.join(REGIONS_DIR, mode), seed=queued_regen)
+    if queued_regen:
         for file_name in os.listdir(output_folder):
             base_name = file_name.replace("_hover", "").replace("_nested", "")
             if base_name.endswith(".png"):
@@ -108,99 +221,139 @@ def generate_regions(mode, borders, frontend_save, queued_regen=False):
                         os.remove(file_path)
                 except PermissionError:
                     print(f"Could not delete {file_path}. Is it open in another program?")
-    else:
-        for file_name in os.listdir(output_folder):
-            file_path = os.path.join(output_folder, file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-
-    painted_colour = set()
-    visited_pixels = set()
-
-    # === STEP 1: Generate normal images ===
-    for y in range(height):
-        for x in range(width):
-            pixel_color = img_data[x, y][:3]
-            if pixel_color in province_to_color and (x, y) not in visited_pixels:
-                color_code = province_to_color[pixel_color]
-                if queued_regen and sanitize_filename(color_code) not in queued:
-                    continue
-                filename = sanitize_filename(color_code) + ".png"
-                new_image_path = os.path.join(output_folder, filename)
-
-                if color_code not in painted_colour:
-                    new_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))  # Transparent image
-                    draw(x, y, new_img, new_image_path, pixel_color, color_code, visited_pixels, img_data, width, height, painted_colour, overrides, output_folder, True)
-                    print(f"New image saved: {new_image_path}")
-                    
-
-                else:
-                    new_img = Image.open(new_image_path)
-                    draw(x, y, new_img, new_image_path, pixel_color, color_code, visited_pixels, img_data, width, height, painted_colour, overrides, output_folder, True)
-                    print(f"Edited: {new_image_path}")
-
-    # === STEP 2: Generate hover versions by lightening existing images ===
-    for file_name in os.listdir(output_folder):
-        # Skip already-hover files
-        if "_hover" in file_name:
-            continue
-
-        # Split base and extension
-        base_name, ext = os.path.splitext(file_name)
 
-        # Determine hover filename
-        if "_nested" in base_name:
-            hover_filename = base_name + "_hover" + ext  # results in something like 255_0_0_nested_hover.png
-        else:
-            hover_filename = base_name + "_hover" + ext  # results in 255_0_0_hover.png
+    jobs = [
+        {
+            "name": name,
+            "color": color,
+            "province_ids": province_ids,
+            "index_paths": index_paths,
+            "shape": (height, width),
+            "output_folder": output_folder,
+            "borders": borders,
+            "cropped": cropped,
+        }
+        for name, (color, province_ids) in layers.items()
+    ]
+    return {
+        "mode": mode,
+        "output_folder": output_folder,
+        "manifest": manifest,
+        "size": (width, height),
+        "jobs": jobs,
+    }
 
-        if queued_regen and base_name not in queued and not base_name.replace("_nested", "") in queued:
-            continue
+def activate_regions(mode, version, frontend_save):
+    """
+    Publishes a snapshot of a mode's region images: output/regions/{mode} and (with frontend_save)
+    the frontend's regions/{mode} switch to it at once, and its sprite manifest is published next to them.
+    Also used to roll back to one of the kept snapshots.
+    """
+    link_path = os.path.join(REGIONS_DIR, mode)
+    snapshot_folder = os.path.join(snapshot_root(link_path), version)
+    activate_snapshot(link_path, version)
+    print(f"Regions of {mode} now at version {version}")
 
-        # Define paths
-        normal_image_path = os.path.join(output_folder, file_name)
-        hover_image_path = os.path.join(output_folder, hover_filename)
+    manifest_paths = [os.path.join(REGIONS_DIR, f"{mode}_manifest.json")]
+    if frontend_save:
+        frontend_link_path = os.path.join(FRONTEND_REGIONS_DIR, mode)
+        if version not in list_versions(frontend_link_path):
+            # The encoded images are linked into the frontend snapshot, not copied
+            publish_folder(snapshot_folder, create_snapshot(frontend_link_path, version))
+        activate_snapshot(frontend_link_path, version)
+        manifest_paths.append(os.path.join(FRONTEND_REGIONS_DIR, f"{mode}_manifest.json"))
 
-        if os.path.exists(normal_image_path) and ext.lower() in [".png", ".jpg", ".jpeg"]:
-            lighten_image(normal_image_path, hover_image_path)
-        else:
-            print(f"Skipping non-image file: {normal_image_path}")
+    snapshot_manifest_path = os.path.join(snapshot_folder, SNAPSHOT_MANIFEST)
+    for manifest_path in manifest_paths:
+        if os.path.exists(snapshot_manifest_path):
+            publish_file(snapshot_manifest_path, manifest_path)
+            print(f"Sprite manifest saved: {manifest_path}")
+        elif os.path.exists(manifest_path):
+            os.remove(manifest_path)
 
+def finish_regions(state, frontend_save, queued_regen, cropped):
+    """
+    Writes the sprite manifest into the mode's new snapshot, publishes it and clears the mode's queue.
+    """
+    mode = state["mode"]
+    output_folder = state["output_folder"]
+    manifest = state["manifest"]
 
+    snapshot_manifest_path = os.path.join(output_folder, SNAPSHOT_MANIFEST)
+    if cropped:
+        existing = {os.path.splitext(file_name)[0] for file_name in os.listdir(output_folder)}
+        manifest["sprites"] = {name: sprite for name, sprite in sorted(manifest["sprites"].items()) if name in existing}
+        manifest["width"], manifest["height"] = state["size"]
+        write_file(snapshot_manifest_path, json.dumps(manifest, indent=2))
+    elif os.path.exists(snapshot_manifest_path):
+        os.remove(snapshot_manifest_path)
 
-    # === STEP 3: Paint Borders ===
-    if borders:
-        for file_name in os.listdir(output_folder):
-            new_image_path = os.path.join(output_folder, file_name)
-            base_name, ext = os.path.splitext(file_name)
-            clean_name = base_name.replace("_hover", "").replace("_nested", "")
-            if queued_regen and clean_name not in queued:
-                continue
-            if os.path.exists(new_image_path):
-                new_img = Image.open(new_image_path).convert("RGBA")
-                new_img_data = new_img.load()
-                paint_borders(True, False, new_img_data, width, height)
-                new_img.save(new_image_path, "PNG")
-                print(f"Borders painted for {new_image_path}")
-            else:
-                print(f"Warning: {new_image_path} not found for border painting.")
-    if frontend_save:
-        DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", "regions", f"{mode}")
-        os.makedirs(DIR, exist_ok=True)
-        for file_name in os.listdir(DIR):
-            file_path = os.path.join(DIR, file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        for file_name in os.listdir(output_folder):
-            new_image_path = os.path.join(output_folder, file_name)
-            if os.path.exists(new_image_path):
-                new_img = Image.open(new_image_path).convert("RGBA")
-                new_img_data = new_img.load()
-                frontend_image_path = os.path.join(DIR, f"{file_name}")
-                new_img.save(frontend_image_path, "PNG")
-                print(f"Region copied for the frontend and saved as {frontend_image_path}")
-            else:
-                print(f"Warning: {new_image_path} not found for frontend copy.")
+    activate_regions(mode, os.path.basename(output_folder), frontend_save)
     if queued_regen:
-        from ..util.queue import clear_mode
-        clear_mode(mode)
+        from ..util.queue import clear_taken
+        clear_taken(mode)
+
+def generate_all_regions(modes, borders, frontend_save, queued_regen=False, cropped=False, workers=None, progress=None):
+    """
+    Generate the region images of several modes, rendering every region of every mode as an
+    independent job on a process pool.
+
+    :param workers: Number of worker processes (None for one per CPU, 1 to render in this process)
+    :param progress: Optional function called as progress(mode, done, total) after every region.
+                     If it raises, the regions that have not started yet are cancelled.
+    """
+    states = []
+    try:
+        for mode in modes:
+            states.append(prepare_regions(mode, borders, queued_regen, cropped))
+        render_all(states, frontend_save, queued_regen, cropped, workers, progress)
+    except BaseException:
+        # Snapshots that were never activated are incomplete, and nothing will read them
+        for state in states:
+            if os.path.basename(state["output_folder"]) not in list_versions(os.path.join(REGIONS_DIR, state["mode"])):
+                discard_snapshot(state["output_folder"])
+        raise
+
+def render_all(states, frontend_save, queued_regen, cropped, workers, progress):
+    """
+    Renders the jobs of every prepared mode, then writes and publishes each mode's snapshot.
+    """
+    jobs = [(state, job) for state in states for job in state["jobs"]]
+    totals = {state["mode"]: len(state["jobs"]) for state in states}
+    done = {mode: 0 for mode in totals}
+
+    def report(state):
+        done[state["mode"]] += 1
+        if progress is not None:
+            progress(state["mode"], done[state["mode"]], totals[state["mode"]])
+
+    results = []
+    if workers == 1 or len(jobs) <= 1:
+        for state, job in jobs:
+            results.append(render_region(job))
+            report(state)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+            try:
+                for (state, _), sprites in zip(jobs, executor.map(render_region, [job for _, job in jobs], chunksize=4)):
+                    results.append(sprites)
+                    report(state)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    for (state, _), sprites in zip(jobs, results):
+        state["manifest"]["sprites"].update(sprites)
+
+    for state in states:
+        finish_regions(state, frontend_save, queued_regen, cropped)
+
+def generate_regions(mode, borders, frontend_save, queued_regen=False, cropped=False, workers=None):
+    """
+    Generate separate images for each region (county, duchy, kingdom).
+
+    With cropped=True every image is cropped to its content, and regions/{mode}_manifest.json
+    records where each sprite sits on the full map:
+    {"width": ..., "height": ..., "sprites": {"255_0_0": {"x": ..., "y": ..., "width": ..., "height": ...}}}
+    """
+    generate_all_regions([mode], borders, frontend_save, queued_regen, cropped, workers)
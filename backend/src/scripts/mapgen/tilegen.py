@@ -0,0 +1,115 @@
+from PIL import Image
+import numpy as np
+import hashlib
+import json
+import math
+import os
+from ..util.publish import save_image, write_file
+
+TILE_SIZE = 256
+TILES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output", "tiles")
+BASE_MAP_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "input", "map.png")
+
+def max_zoom(width, height, tile_size=TILE_SIZE):
+    """
+    Zoom level at which the map is shown at full resolution (zoom 0 fits the whole map in one tile).
+    """
+    return max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+
+def pyramid_levels(img):
+    """
+    Yields (zoom, image) pairs from full resolution down to zoom 0, halving the size at every step.
+    """
+    level = img
+    for z in range(max_zoom(*img.size), -1, -1):
+        yield z, level
+        width, height = level.size
+        level = level.resize((max(1, math.ceil(width / 2)), max(1, math.ceil(height / 2))), Image.BOX)
+
+def tile_path(name, z, x, y):
+    return os.path.join(TILES_DIR, name, str(z), str(x), f"{y}.png")
+
+def load_tile_info(name):
+    """
+    Loads the tile metadata of a map (size, tile size, zoom range and tile hashes), or None.
+    """
+    info_path = os.path.join(TILES_DIR, name, "tiles.json")
+    if os.path.exists(info_path):
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+def build_tiles(name, img, source=None):
+    """
+    Cuts a map into a z/x/y tile pyramid under output/tiles/{name}.
+    Every tile's pixels are hashed and only tiles whose content changed are encoded again, so a
+    queued regeneration only rewrites the tiles its regions touch. Fully transparent tiles are not stored.
+
+    :param name: Pyramid name (the map mode, or "base" for the base map)
+    :param img: The full-resolution map image
+    :param source: Optional signature of the source file, stored so unchanged inputs can be skipped
+    """
+    img = img.convert("RGBA")
+    width, height = img.size
+    old_info = load_tile_info(name) or {}
+    same_layout = (old_info.get("width"), old_info.get("height"), old_info.get("tile_size")) == (width, height, TILE_SIZE)
+    old_hashes = old_info.get("tiles", {}) if same_layout else {}
+
+    hashes = {}
+    written = 0
+    for z, level in pyramid_levels(img):
+        pixels = np.asarray(level)
+        level_height, level_width = pixels.shape[:2]
+        for tx in range(math.ceil(level_width / TILE_SIZE)):
+            for ty in range(math.ceil(level_height / TILE_SIZE)):
+                tile = pixels[ty * TILE_SIZE:(ty + 1) * TILE_SIZE, tx * TILE_SIZE:(tx + 1) * TILE_SIZE]
+                path = tile_path(name, z, tx, ty)
+                if not tile[..., 3].any():
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+
+                key = f"{z}/{tx}/{ty}"
+                hashes[key] = hashlib.blake2b(tile.tobytes(), digest_size=16).hexdigest()
+                if old_hashes.get(key) == hashes[key] and os.path.exists(path):
+                    continue
+
+                # Edge tiles are padded so every tile has the same size
+                padded = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+                padded[:tile.shape[0], :tile.shape[1]] = tile
+                # Swapped in whole, the API may be serving the old tile
+                save_image(Image.fromarray(padded), path)
+                written += 1
+
+    # Tiles of an old layout that no longer exist
+    for key in set(old_info.get("tiles", {})) - set(hashes):
+        path = tile_path(name, *key.split("/"))
+        if os.path.exists(path):
+            os.remove(path)
+
+    info = {
+        "width": width,
+        "height": height,
+        "tile_size": TILE_SIZE,
+        "max_zoom": max_zoom(width, height),
+        "source": source,
+        "tiles": hashes,
+    }
+    write_file(os.path.join(TILES_DIR, name, "tiles.json"), json.dumps(info))
+    print(f"Tiles for {name}: {written} rebuilt, {len(hashes) - written} unchanged")
+
+def build_base_tiles():
+    """
+    Tiles input/map.png, skipping the work when the file has not changed since the last build.
+    """
+    if not os.path.exists(BASE_MAP_PATH):
+        print("No base map found in input/, skipping base tiles")
+        return
+    st = os.stat(BASE_MAP_PATH)
+    source = [st.st_mtime_ns, st.st_size]
+    info = load_tile_info("base")
+    if info is not None and info.get("source") == source:
+        print("Base map unchanged, tiles are up to date")
+        return
+    with Image.open(BASE_MAP_PATH) as img:
+        build_tiles("base", img, source)
@@ -0,0 +1,302 @@
+from scipy import ndimage
+import numpy as np
+import svgwrite
+import json
+import os
+from ..util.hierarchy import get_hierarchy, MODE_TITLES
+from ..util.colour_mapping import build_overrides
+from ..util.province_raster import load_province_raster, region_raster
+from ..util.publish import publish_file, write_file
+from .regiongen import sanitize_filename
+
+VECTORS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "output", "vectors")
+FRONTEND_VECTORS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "frontend", "public", "data", "vectors")
+
+# Default Douglas-Peucker tolerance, in map pixels
+DEFAULT_TOLERANCE = 1.0
+
+def find_junctions(regions):
+    """
+    Marks the pixel corners where three or more regions (or the unpainted background) meet, and
+    corners where two regions touch diagonally. Shared boundaries are split at these corners so
+    neighbouring regions simplify them the same way.
+
+    :return: A (height + 1, width + 1) boolean array
+    """
+    padded = np.pad(regions, 1)
+    a, b = padded[:-1, :-1], padded[:-1, 1:]
+    c, d = padded[1:, :-1], padded[1:, 1:]
+    distinct = 1 + (b != a) + ((c != a) & (c != b)) + ((d != a) & (d != b) & (d != c))
+    diagonal = (a == d) & (b == c) & (a != b)
+    return (distinct >= 3) | diagonal
+
+def edge_runs(edges, breaks):
+    """
+    Joins horizontally adjacent edge pixels into runs, splitting runs at break points.
+
+    :param edges: (h, w) boolean array of unit edges
+    :param breaks: (h, w) boolean array, True where a run must start at that pixel's left corner
+    :return: (row, first column, last column + 1) arrays
+    """
+    previous = np.zeros_like(edges)
+    previous[:, 1:] = edges[:, :-1]
+    starts = edges & (~previous | breaks)
+    positions = np.flatnonzero(edges)
+    run_starts = starts.ravel()[positions]
+    start_positions = positions[run_starts]
+    end_positions = positions[np.append(np.flatnonzero(run_starts)[1:] - 1, len(positions) - 1)] if len(positions) else positions
+    width = edges.shape[1]
+    return start_positions // width, start_positions % width, end_positions % width + 1
+
+def boundary_segments(mask, junctions, origin):
+    """
+    Straight boundary segments of a region mask, directed so the region lies on their right (y down).
+
+    :param mask: (h, w) boolean mask cut from the map at origin
+    :param junctions: The matching (h + 1, w + 1) slice of find_junctions
+    :param origin: (top, left) of the mask on the map
+    :return: A list of ((x0, y0), (x1, y1)) map corner coordinates
+    """
+    top, left = origin
+    padded = np.pad(mask, 1)
+    inside = padded[1:-1, 1:-1]
+    segments = []
+
+    # Top edges run right, bottom edges run left
+    rows, first, last = edge_runs(inside & ~padded[:-2, 1:-1], junctions[:-1, :-1])
+    segments += [((left + c0, top + r), (left + c1, top + r)) for r, c0, c1 in zip(rows.tolist(), first.tolist(), last.tolist())]
+    rows, first, last = edge_runs(inside & ~padded[2:, 1:-1], junctions[1:, :-1])
+    segments += [((left + c1, top + r + 1), (left + c0, top + r + 1)) for r, c0, c1 in zip(rows.tolist(), first.tolist(), last.tolist())]
+
+    # Left edges run up, right edges run down (transposed so runs follow columns)
+    cols, first, last = edge_runs((inside & ~padded[1:-1, :-2]).T, junctions[:-1, :-1].T)
+    segments += [((left + c, top + r1), (left + c, top + r0)) for c, r0, r1 in zip(cols.tolist(), first.tolist(), last.tolist())]
+    cols, first, last = edge_runs((inside & ~padded[1:-1, 2:]).T, junctions[:-1, 1:].T)
+    segments += [((left + c + 1, top + r0), (left + c + 1, top + r1)) for c, r0, r1 in zip(cols.tolist(), first.tolist(), last.tolist())]
+    return segments
+
+def direction(start, end):
+    return ((end[0] > start[0]) - (end[0] < start[0]), (end[1] > start[1]) - (end[1] < start[1]))
+
+def chain_rings(segments):
+    """
+    Links directed segments into closed rings. Where two regions' pixels touch diagonally a corner has
+    two ways out; the right turn is taken so diagonal neighbours become separate rings.
+
+    :return: A list of rings, each a list of corner points (not repeating the first point)
+    """
+    outgoing = {}
+    for start, end in segments:
+        outgoing.setdefault(start, []).append(end)
+
+    rings = []
+    for start in list(outgoing):
+        while outgoing.get(start):
+            ring = [start]
+            point = outgoing[start].pop()
+            heading = direction(start, point)
+            while point != start:
+                ring.append(point)
+                ends = outgoing[point]
+                if len(ends) > 1:
+                    right = (-heading[1], heading[0])
+                    ends.sort(key=lambda end: direction(point, end) == right)
+                following = ends.pop()
+                heading = direction(point, following)
+                point = following
+            rings.append(ring)
+    return rings
+
+def ring_area(points):
+    """
+    Shoelace area: positive for outer rings (clockwise with y down), negative for holes.
+    """
+    xs, ys = points[:, 0], points[:, 1]
+    return (np.dot(xs, np.roll(ys, -1)) - np.dot(np.roll(xs, -1), ys)) / 2
+
+def douglas_peucker(points, tolerance):
+    """
+    Simplifies a polyline, always keeping its first and last point.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        between = points[first + 1:last]
+        line = end - start
+        length = np.hypot(*line)
+        if length == 0:
+            distances = np.hypot(*(between - start).T)
+        else:
+            distances = np.abs(line[0] * (between[:, 1] - start[1]) - line[1] * (between[:, 0] - start[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return points[keep]
+
+def simplify_arc(arc, tolerance):
+    """
+    Simplifies an arc in a canonical direction, so the two regions sharing it get the same points.
+    A closed arc (a ring with no junction on it) that would collapse is kept as it is.
+    """
+    arc = np.asarray(arc, dtype=np.int64)
+    closed = tuple(arc[0]) == tuple(arc[-1])
+    reverse = tuple(arc[0]) > tuple(arc[-1]) or (closed and tuple(arc[1]) > tuple(arc[-2]))
+    canonical = arc[::-1] if reverse else arc
+    simplified = douglas_peucker(canonical, tolerance)
+    if closed and len(simplified) < 4:
+        simplified = canonical
+    return simplified[::-1] if reverse else simplified
+
+def simplify_ring(ring, junctions, tolerance):
+    """
+    Splits a ring at its junctions and simplifies every arc between them.
+    """
+    if tolerance <= 0:
+        return np.asarray(ring, dtype=np.int64)
+    cuts = [i for i, (x, y) in enumerate(ring) if junctions[y, x]]
+    if not cuts:
+        # Start closed arcs at their smallest point so both sides agree on the arc
+        first = min(range(len(ring)), key=lambda i: ring[i])
+        arc = ring[first:] + ring[:first + 1]
+        return simplify_arc(arc, tolerance)[:-1]
+
+    ring = ring[cuts[0]:] + ring[:cuts[0]]
+    cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+    ring = ring + ring[:1]
+    points = []
+    for first, last in zip(cuts, cuts[1:]):
+        points.append(simplify_arc(ring[first:last + 1], tolerance)[:-1])
+    return np.concatenate(points)
+
+def inner_pixel(ring):
+    """
+    The (row, column) of the pixel on the right of a ring's first edge, which belongs to the region.
+    """
+    (x0, y0), (x1, y1) = ring[0], ring[1]
+    dx, dy = direction((x0, y0), (x1, y1))
+    return int(y0 + (dy + dx - 1) / 2), int(x0 + (dx - dy - 1) / 2)
+
+def region_polygons(mask, origin, junctions, tolerance):
+    """
+    Traces one region into polygons, each a list of rings (outer ring first, then its holes).
+    Holes are matched to outer rings through the 4-connected pixel area both of them border.
+
+    :param mask: The region's pixels inside its bounding box
+    :param origin: (top, left) of the bounding box on the map
+    :param junctions: find_junctions of the whole map
+    """
+    top, left = origin
+    height, width = mask.shape
+    components, _ = ndimage.label(mask)
+    segments = boundary_segments(mask, junctions[top:top + height + 1, left:left + width + 1], origin)
+
+    polygons = {}
+    holes = []
+    for ring in chain_rings(segments):
+        row, col = inner_pixel(ring)
+        component = components[row - top, col - left]
+        points = simplify_ring(ring, junctions, tolerance)
+        if len(points) < 3 or ring_area(points) == 0:
+            continue
+        if ring_area(np.asarray(ring)) > 0:
+            polygons.setdefault(component, []).insert(0, points)
+        else:
+            holes.append((component, points))
+    for component, hole in holes:
+        if component in polygons:
+            polygons[component].append(hole)
+    return [polygons[component] for component in sorted(polygons)]
+
+def region_properties(mode, index, color, overrides):
+    """
+    GeoJSON properties of a region: its colour, title ID and name, and its overlord's colour (nations only).
+    """
+    rgb = ",".join(map(str, color))
+    titles = getattr(index, MODE_TITLES[mode])
+    title_id = next((title for title, data in titles.items() if isinstance(data, dict) and data.get("rgb") == rgb), None)
+    overlord = overrides.get(color)
+    return {
+        "rgb": rgb,
+        "id": title_id,
+        "name": titles[title_id].get("name") if title_id else None,
+        "overlord": ",".join(map(str, overlord)) if overlord else None,
+    }
+
+def trace_regions(mode, labels, index, tolerance=DEFAULT_TOLERANCE):
+    """
+    Traces every region of a mode into simplified polygons.
+
+    :return: A list of (region colour, polygons) pairs, where every polygon is a list of (n, 2) rings
+    """
+    regions, colors = region_raster(mode, labels, index)
+    junctions = find_junctions(regions)
+    traced = []
+    for label, bounds in enumerate(ndimage.find_objects(regions), start=1):
+        if bounds is None:
+            continue
+        mask = regions[bounds] == label
+        polygons = region_polygons(mask, (bounds[0].start, bounds[1].start), junctions, tolerance)
+        if polygons:
+            traced.append((colors[label - 1], polygons))
+    return traced
+
+def to_geojson(mode, traced, index, size):
+    overrides = build_overrides(index.nations) if mode == "nation" else {}
+    features = [
+        {
+            "type": "Feature",
+            "properties": region_properties(mode, index, color, overrides),
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [np.vstack([ring, ring[:1]]).tolist() for ring in polygon]
+                    for polygon in polygons
+                ],
+            },
+        }
+        for color, polygons in traced
+    ]
+    # Coordinates are map pixels with y pointing down
+    return {"type": "FeatureCollection", "mode": mode, "width": size[0], "height": size[1], "features": features}
+
+def to_svg(traced, size):
+    width, height = size
+    drawing = svgwrite.Drawing(size=(width, height), viewBox=f"0 0 {width} {height}")
+    for color, polygons in traced:
+        path = " ".join(
+            "M" + " L".join(f"{x},{y}" for x, y in ring.tolist()) + " Z"
+            for polygon in polygons for ring in polygon
+        )
+        drawing.add(drawing.path(d=path, id=sanitize_filename(color), fill=svgwrite.rgb(*color), fill_rule="evenodd"))
+    return drawing.tostring()
+
+def generate_vectors(modes, frontend_save, tolerance=DEFAULT_TOLERANCE):
+    """
+    Writes output/vectors/{mode}.geojson and {mode}.svg: every region of a mode as polygons dissolved
+    from its provinces, simplified with the given Douglas-Peucker tolerance (in pixels, 0 keeps
+    every pixel corner). Boundaries shared by two regions are simplified identically, so the
+    polygons still fit together without gaps.
+    """
+    labels = np.asarray(load_province_raster())
+    index = get_hierarchy()
+    size = (labels.shape[1], labels.shape[0])
+    os.makedirs(VECTORS_DIR, exist_ok=True)
+
+    for mode in modes:
+        traced = trace_regions(mode, labels, index, tolerance)
+        geojson_path = os.path.join(VECTORS_DIR, f"{mode}.geojson")
+        write_file(geojson_path, json.dumps(to_geojson(mode, traced, index, size), ensure_ascii=False, separators=(",", ":")))
+        svg_path = os.path.join(VECTORS_DIR, f"{mode}.svg")
+        write_file(svg_path, to_svg(traced, size))
+        print(f"Vectors for {mode}: {len(traced)} regions saved to {geojson_path}")
+
+        if frontend_save:
+            for path in (geojson_path, svg_path):
+                publish_file(path, os.path.join(FRONTEND_VECTORS_DIR, os.path.basename(path)))
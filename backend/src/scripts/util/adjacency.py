@@ -0,0 +1,79 @@
+import numpy as np
+import os
+from .province_raster import load_province_raster, raster_version, cache_path, open_cached_array, store_array
+
+# (raster key, edge array)
+_adjacency_cache = None
+
+def build_adjacency(labels):
+    """
+    Finds every pair of provinces that share a border, and how long that border is.
+    Province 0 stands for the void: unpainted pixels and everything outside the map, so a
+    province's border with 0 is its coast.
+
+    :param labels: The province-ID raster
+    :return: An (n, 3) int64 array of rows (a, b, border length in pixel edges) with a < b, sorted
+    """
+    padded = np.pad(np.asarray(labels), 1).astype(np.int64)
+    max_id = int(padded.max())
+    keys = []
+    for first, second in ((padded[:, :-1], padded[:, 1:]), (padded[:-1, :], padded[1:, :])):
+        differs = first != second
+        a, b = first[differs], second[differs]
+        keys.append(np.minimum(a, b) * (max_id + 1) + np.maximum(a, b))
+    pairs, lengths = np.unique(np.concatenate(keys), return_counts=True)
+    return np.stack([pairs // (max_id + 1), pairs % (max_id + 1), lengths], axis=1)
+
+def load_adjacency():
+    """
+    Returns the adjacency edges of the current map, computed once per map version and stored
+    next to the cached raster (cache/raster/<key>.adjacency.npy).
+    """
+    global _adjacency_cache
+
+    key = raster_version()
+    if _adjacency_cache is None or _adjacency_cache[0] != key:
+        path = cache_path(key, "adjacency")
+        if not os.path.exists(path):
+            store_array(path, build_adjacency(load_province_raster()))
+        _adjacency_cache = (key, open_cached_array(path))
+    return _adjacency_cache[1]
+
+def get_neighbors(province_id):
+    """
+    Neighbours of a province with the length of each shared border.
+
+    :return: {"coast": bool, "void_border": int, "neighbors": {province ID: border length}}
+    """
+    edges = load_adjacency()
+    touching = (edges[:, 0] == province_id) | (edges[:, 1] == province_id)
+    neighbors = {}
+    void_border = 0
+    for a, b, length in edges[touching].tolist():
+        other = b if a == province_id else a
+        if other == 0:
+            void_border = length
+        else:
+            neighbors[other] = length
+    return {"coast": void_border > 0, "void_border": void_border, "neighbors": neighbors}
+
+def are_adjacent(a, b):
+    """
+    Whether two provinces share a border.
+    """
+    edges = load_adjacency()
+    a, b = min(a, b), max(a, b)
+    return bool(((edges[:, 0] == a) & (edges[:, 1] == b)).any())
+
+def adjacency_graph():
+    """
+    The whole graph for bulk download: province pairs with their border length, and the
+    coast length of every province that touches the void.
+    """
+    edges = load_adjacency()
+    void = edges[:, 0] == 0
+    return {
+        "version": raster_version(),
+        "edges": edges[~void].tolist(),
+        "coast": edges[void][:, 1:].tolist(),
+    }
@@ -1,37 +1,58 @@
+import numpy as np
+from scipy import ndimage
+
 # Now, after all provinces are painted, paint the borders
 border_color = (0, 0, 0, 255)  # Solid black for kingdom borders
 duchy_border_color = (255, 255, 255, 255)  # White for duchy borders
 border_thickness = 5  # Adjustable thickness
 
-def paint_borders(outline, between, new_img_data, height, width):
-    borders = set()
-    # Iterate through all pixels and check for borders
+def find_edges(pixels, between):
+    """
+    Finds the non-transparent pixels that touch a differently coloured pixel on their left, right, top or bottom.
+
+    :param pixels: A (height, width, 4) RGBA array
+    :param between: Also count edges between two painted regions, not only edges against transparency
+    :return: A (height, width) boolean mask
+    """
+    packed = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    transparent = pixels[..., 3] == 0
+    edges = np.zeros(packed.shape, dtype=bool)
+
+    for axis in (0, 1):
+        first = [slice(None), slice(None)]
+        second = [slice(None), slice(None)]
+        first[axis] = slice(None, -1)
+        second[axis] = slice(1, None)
+        first, second = tuple(first), tuple(second)
+
+        differs = packed[first] != packed[second]
+        if between:
+            edges[first] |= differs
+            edges[second] |= differs
+        else:
+            edges[first] |= differs & transparent[second]
+            edges[second] |= differs & transparent[first]
+
+    edges &= ~transparent
+    return edges
+
+def border_mask(pixels, between, thickness=border_thickness):
+    """
+    Edge pixels thickened into a square of (2 * thickness + 1) pixels, clipped at the image bounds.
+    """
+    edges = find_edges(pixels, between)
+    size = 2 * thickness + 1
+    return ndimage.maximum_filter(edges, size=size, mode="constant", cval=False)
+
+def paint_borders(outline, between, pixels, thickness=border_thickness):
+    """
+    Paints borders onto an RGBA array in place.
+
+    :param outline: Paint borders at all (kept for the existing call sites)
+    :param between: Also paint borders between two painted regions
+    :param pixels: A (height, width, 4) RGBA array
+    :return: The same array, with borders painted
+    """
     if outline:
-        for y in range(height):
-            for x in range(width):
-                pixel_color = new_img_data[x, y]
-                if pixel_color[3] != 0:  # Only check non-transparent pixels
-                    # Check neighboring pixels
-                    neighbors = [
-                        (x - 1, y),  # Left
-                        (x + 1, y),  # Right
-                        (x, y - 1),  # Up
-                        (x, y + 1),  # Down
-                    ]
-                    for nx, ny in neighbors:
-                        if 0 <= nx < width and 0 <= ny < height:
-                            neighbor_color = new_img_data[nx, ny]
-                            if pixel_color != neighbor_color:  # Different color means border
-                                if not between and neighbor_color[3] != 0:
-                                    continue  # Skip if we are only drawing kingdom borders
-                                else:
-                                    for dx in range(-border_thickness, border_thickness + 1):
-                                        for dy in range(-border_thickness, border_thickness + 1):
-                                            bx, by = x + dx, y + dy
-                                            if 0 <= bx < width and 0 <= by < height:
-                                                borders.add((bx, by))
-
-    # Apply the border color to all detected border pixels
-    for x, y in borders:
-        new_img_data[x, y] = border_color
-    return new_img_data
\ No newline at end of file
+        pixels[border_mask(pixels, between, thickness)] = border_color
+    return pixels
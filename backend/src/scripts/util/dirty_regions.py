@@ -0,0 +1,99 @@
+import json
+import os
+from .hierarchy import HierarchyIndex, get_hierarchy
+from .colour_mapping import build_overrides
+
+DEFINES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "defines")
+
+MODES = ["nation", "duchy", "kingdom", "county", "empire"]
+
+# Uploaded mode -> HierarchyIndex argument its data replaces
+UPLOAD_SOURCES = {
+    "nation": "nations",
+    "county": "counties",
+    "duchy": "duchies",
+    "kingdom": "kingdoms",
+    "empire": "empires",
+}
+
+def load_compiled_nations():
+    """
+    The nations as of the last regeneration (defines/nation.json), or the raw input if none was compiled yet.
+    """
+    path = os.path.join(DEFINES_DIR, "nation.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return get_hierarchy().nations
+
+def rgb_string(color):
+    return ",".join(map(str, color))
+
+def overlord_chain(color, overrides):
+    """
+    Yields the colours of every overlord above a region (guarding against cycles).
+    """
+    chain = {color}
+    while color in overrides and overrides[color] not in chain:
+        color = overrides[color]
+        chain.add(color)
+        yield color
+
+def mode_overrides(index, mode):
+    if mode != "nation":
+        return {}
+    return build_overrides({nation: data for nation, data in index.nations.items() if isinstance(data, dict)})
+
+def diff_mode(old_index, new_index, mode):
+    """
+    Colours of the regions of a mode whose images differ between two versions of the data:
+    regions that gained or lost a province, regions whose colour or overlord changed, and
+    every overlord above them (overlord images contain their subjects' provinces).
+    """
+    old_map = old_index.color_mapping(mode)
+    new_map = new_index.color_mapping(mode)
+    old_overrides = mode_overrides(old_index, mode)
+    new_overrides = mode_overrides(new_index, mode)
+
+    dirty = set()
+    for province_rgb in set(old_map) | set(new_map):
+        before, after = old_map.get(province_rgb), new_map.get(province_rgb)
+        if before != after:
+            dirty.update(color for color in (before, after) if color is not None)
+
+    for color in set(old_overrides) | set(new_overrides):
+        if old_overrides.get(color) != new_overrides.get(color):
+            dirty.add(color)
+
+    for color in list(dirty):
+        for overrides in (old_overrides, new_overrides):
+            dirty.update(overlord_chain(color, overrides))
+    return dirty
+
+def find_dirty_regions(mode, new_data):
+    """
+    Diffs uploaded title or nation data against the data the current images were rendered from.
+    Must be called before the upload is written.
+
+    :param mode: The uploaded mode (nation, county, duchy, kingdom or empire)
+    :param new_data: The uploaded JSON
+    :return: Mode -> sorted "r,g,b" strings of the regions to render again (modes without changes are left out)
+    """
+    hierarchy = get_hierarchy()
+    sources = {
+        "provinces": hierarchy.provinces,
+        "counties": hierarchy.counties,
+        "duchies": hierarchy.duchies,
+        "kingdoms": hierarchy.kingdoms,
+        "empires": hierarchy.empires,
+        "nations": load_compiled_nations(),
+    }
+    old_index = HierarchyIndex(**sources)
+    new_index = HierarchyIndex(**dict(sources, **{UPLOAD_SOURCES[mode]: new_data}))
+
+    dirty = {}
+    for region_mode in MODES:
+        colors = diff_mode(old_index, new_index, region_mode)
+        if colors:
+            dirty[region_mode] = sorted(rgb_string(color) for color in colors)
+    return dirty
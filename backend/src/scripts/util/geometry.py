@@ -0,0 +1,87 @@
+import os
+from .hierarchy import get_hierarchy, data_version, parse_rgb, MODE_TITLES
+from .province_raster import (
+    load_province_raster, raster_version, cache_path, open_cached_array, store_array, label_geometry, region_raster
+)
+
+# (raster key, province geometry table)
+_geometry_cache = None
+# (raster key, data version, mode) -> (region colours, region geometry table)
+_region_geometry_cache = {}
+
+def load_geometry():
+    """
+    Returns the province geometry table of the current map, computed once per map version
+    (cache/raster/<key>.geometry.npy).
+    """
+    global _geometry_cache
+
+    key = raster_version()
+    if _geometry_cache is None or _geometry_cache[0] != key:
+        path = cache_path(key, "geometry")
+        if not os.path.exists(path):
+            # Rasters cached before geometry was measured
+            store_array(path, label_geometry(load_province_raster()))
+        _geometry_cache = (key, open_cached_array(path))
+    return _geometry_cache[1]
+
+def geometry_dict(row):
+    area, x, y, width, height, centroid_x, centroid_y, islands = row.tolist()
+    return {
+        "area": int(area),
+        "bbox": {"x": int(x), "y": int(y), "width": int(width), "height": int(height)},
+        "centroid": [round(centroid_x, 2), round(centroid_y, 2)],
+        "islands": int(islands),
+    }
+
+def get_province_geometry(province_id):
+    """
+    Geometry of one province, or None if it has no pixels on the map.
+    """
+    table = load_geometry()
+    if not 0 < province_id < len(table) or table[province_id, 0] == 0:
+        return None
+    return geometry_dict(table[province_id])
+
+def load_region_geometry(mode):
+    """
+    Geometry of every region of a mode, measured on the dissolved region raster (so islands that
+    span several provinces count once). Computed once per map and data version.
+
+    :return: (list of region colours, table where row i + 1 belongs to colours[i])
+    """
+    cache_key = (raster_version(), data_version(), mode)
+    if cache_key not in _region_geometry_cache:
+        regions, colors = region_raster(mode, load_province_raster(), get_hierarchy())
+        # Entries of older map or data versions are never asked for again
+        for old_key in [old_key for old_key in _region_geometry_cache if old_key[:2] != cache_key[:2]]:
+            del _region_geometry_cache[old_key]
+        _region_geometry_cache[cache_key] = (colors, label_geometry(regions))
+    return _region_geometry_cache[cache_key]
+
+def get_region_geometry(mode, title_id):
+    """
+    Geometry of a title (e.g. COUNTY_1 or NATION_3) as painted on its mode's map, or None if the
+    title does not exist or has no pixels.
+    """
+    if mode not in MODE_TITLES:
+        return None
+    index = get_hierarchy()
+    title = getattr(index, MODE_TITLES[mode]).get(title_id)
+    if not isinstance(title, dict) or "rgb" not in title:
+        return None
+
+    color = parse_rgb(title["rgb"])
+    colors, table = load_region_geometry(mode)
+    if color not in colors:
+        return None
+
+    provinces = sorted(index.provinces[rgb] for rgb, region_color in index.color_mapping(mode).items() if region_color == color)
+    return dict(
+        geometry_dict(table[colors.index(color) + 1]),
+        mode=mode,
+        id=title_id,
+        name=title.get("name"),
+        rgb=title["rgb"],
+        provinces=provinces,
+    )
@@ -0,0 +1,156 @@
+import os
+from ..loader.provinces import load_provinces
+from ..loader.counties import load_counties
+from ..loader.duchies import load_duchies
+from ..loader.kingdoms import load_kingdoms
+from ..loader.nations import load_nations
+from ..loader.empires import load_empires
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+# Every file the hierarchy is built from; a change to any of them means a new data version
+SOURCE_PATHS = [
+    os.path.join(BASE_DIR, "defines", "provinces.txt"),
+    os.path.join(BASE_DIR, "defines", "county.json"),
+    os.path.join(BASE_DIR, "defines", "duchy.json"),
+    os.path.join(BASE_DIR, "defines", "kingdom.json"),
+    os.path.join(BASE_DIR, "defines", "empire.json"),
+    os.path.join(BASE_DIR, "input", "nation.json"),
+]
+
+# Mode -> HierarchyIndex attribute holding the titles of that mode
+MODE_TITLES = {
+    "county": "counties",
+    "duchy": "duchies",
+    "kingdom": "kingdoms",
+    "empire": "empires",
+    "nation": "nations",
+}
+
+# (data version, HierarchyIndex)
+_index_cache = None
+
+def parse_rgb(rgb):
+    """
+    Converts an "r,g,b" string to an RGB tuple.
+    """
+    return tuple(map(int, rgb.split(",")))
+
+def data_version():
+    """
+    Modification time and size of every source file, used to detect changed defines.
+    """
+    version = []
+    for path in SOURCE_PATHS:
+        try:
+            st = os.stat(path)
+            version.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+class HierarchyIndex:
+    """
+    Province and title relations for one version of the defines, with the province -> colour
+    table of each mode memoized.
+    """
+    def __init__(self, provinces, counties, duchies, kingdoms, empires, nations):
+        self.provinces = provinces
+        self.counties = counties
+        self.duchies = duchies
+        self.kingdoms = kingdoms
+        self.empires = empires
+        self.nations = nations
+
+        # Province ID -> RGB colours on the province map
+        self.province_rgbs = {}
+        for rgb, province_id in provinces.items():
+            self.province_rgbs.setdefault(province_id, []).append(rgb)
+
+        self.county_provinces = {county: data.get("provinces", []) for county, data in counties.items()}
+        self.duchy_counties = {duchy: data.get("titles", []) for duchy, data in duchies.items()}
+        self.kingdom_duchies = {kingdom: data.get("titles", []) for kingdom, data in kingdoms.items()}
+        self.empire_kingdoms = {empire: data.get("titles", []) for empire, data in empires.items()}
+        self.nation_provinces = {
+            nation: data.get("provinces", []) for nation, data in nations.items() if isinstance(data, dict)
+        }
+
+        self._color_mappings = {}
+
+    def _paint(self, province_to_color, province_ids, color):
+        for province_id in province_ids:
+            for province_rgb in self.province_rgbs.get(province_id, ()):
+                province_to_color[province_rgb] = color
+
+    def _duchy_provinces(self, duchy):
+        for county in self.duchy_counties[duchy]:
+            if county in self.county_provinces:
+                yield from self.county_provinces[county]
+
+    def color_mapping(self, mode):
+        """
+        Province RGB -> region RGB for the given mode. Titles without a parent title are painted black.
+        """
+        if mode in self._color_mappings:
+            return self._color_mappings[mode]
+
+        province_to_color = {}
+
+        if mode == "empire":
+            kingdom_to_empire = {
+                kingdom: parse_rgb(self.empires[e]["rgb"])
+                for e in self.empires for kingdom in self.empire_kingdoms[e]
+            }
+            for kingdom, duchies in self.kingdom_duchies.items():
+                empire_color = kingdom_to_empire.get(kingdom, (0, 0, 0))
+                for duchy in duchies:
+                    if duchy in self.duchy_counties:
+                        self._paint(province_to_color, self._duchy_provinces(duchy), empire_color)
+
+        elif mode == "kingdom":
+            duchy_to_kingdom = {
+                duchy: parse_rgb(self.kingdoms[k]["rgb"])
+                for k in self.kingdoms for duchy in self.kingdom_duchies[k]
+            }
+            for duchy in self.duchy_counties:
+                kingdom_color = duchy_to_kingdom.get(duchy, (0, 0, 0))
+                self._paint(province_to_color, self._duchy_provinces(duchy), kingdom_color)
+
+        elif mode == "duchy":
+            county_to_duchy = {
+                county: parse_rgb(self.duchies[d]["rgb"])
+                for d in self.duchies for county in self.duchy_counties[d]
+            }
+            for county, province_ids in self.county_provinces.items():
+                duchy_color = county_to_duchy.get(county, (0, 0, 0))
+                self._paint(province_to_color, province_ids, duchy_color)
+
+        elif mode == "county":
+            for county, province_ids in self.county_provinces.items():
+                self._paint(province_to_color, province_ids, parse_rgb(self.counties[county]["rgb"]))
+
+        elif mode == "nation":
+            for nation, province_ids in self.nation_provinces.items():
+                self._paint(province_to_color, province_ids, parse_rgb(self.nations[nation]["rgb"]))
+
+        self._color_mappings[mode] = province_to_color
+        return province_to_color
+
+def get_hierarchy():
+    """
+    Returns the hierarchy index for the current defines, rebuilding it only when a source file changed.
+    """
+    global _index_cache
+
+    version = data_version()
+    if _index_cache is None or _index_cache[0] != version:
+        index = HierarchyIndex(
+            load_provinces(),
+            load_counties(),
+            load_duchies(),
+            load_kingdoms(),
+            load_empires(),
+            load_nations(),
+        )
+        _index_cache = (version, index)
+    return _index_cache[1]
@@ -1,23 +1,47 @@
-from PIL import Image
-import os
+import numpy as np
+from .province_raster import load_province_raster
+from .adjacency import load_adjacency
+from .geometry import load_geometry
 
-provinces_cache = None
-image_cache = None
+def preload():
+    """
+    Loads the province raster ahead of the first lookup and pages it into memory, and builds
+    the province adjacency graph and geometry index if this map version does not have them yet.
+    """
+    labels = load_province_raster()
+    labels.max()
+    load_adjacency()
+    load_geometry()
+    return labels.shape
 
 def find_province(x, y):
-    global provinces_cache, image_cache
+    """
+    Returns the province ID at map coordinates (x, y), or 0 if there is no province there
+    or the coordinates are outside the map.
+    """
+    labels = load_province_raster()
+    height, width = labels.shape
+    if not (0 <= x < width and 0 <= y < height):
+        return 0
+    return int(labels[y, x])
 
-    if provinces_cache is None:
-        from ..loader.provinces import load_provinces
-        provinces_cache = load_provinces()
+def find_provinces(coords):
+    """
+    Looks up many map coordinates at once.
 
-    if image_cache is None:
-        provinces_path = os.path.join(os.path.dirname(__file__), "..", "..", "input", "provinces.png")
-        image_cache = Image.open(provinces_path)
-
-    pixel_color = image_cache.getpixel((x, y))
-    if len(pixel_color) == 4:
-        pixel_color = pixel_color[:3]
-
-    return provinces_cache.get(pixel_color, 0)
+    :param coords: A sequence of (x, y) pairs
+    :return: A list with the province ID of every pair (0 for no province or out of bounds)
+    """
+    labels = load_province_raster()
+    height, width = labels.shape
+    # Pairs outside the map are looked up as (-1, -1), so huge coordinates never reach numpy
+    points = np.asarray([
+        pair if 0 <= pair[0] < width and 0 <= pair[1] < height else (-1, -1)
+        for pair in coords
+    ], dtype=np.int64).reshape(-1, 2)
+    xs, ys = points[:, 0], points[:, 1]
 
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    province_ids = np.zeros(len(points), dtype=np.int64)
+    province_ids[inside] = labels[ys[inside], xs[inside]]
+    return province_ids.tolist()
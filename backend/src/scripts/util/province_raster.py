@@ -0,0 +1,230 @@
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+import hashlib
+import io
+import os
+from ..loader.provinces import load_provinces
+from .publish import write_file
+
+PROVINCES_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "input", "provinces.png")
+PROVINCES_TXT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "defines", "provinces.txt")
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "raster")
+
+# Columns of a geometry table (one row per label)
+GEOMETRY_COLUMNS = ["area", "x", "y", "width", "height", "centroid_x", "centroid_y", "islands"]
+
+# In-process cache: (file signatures, content key, memory-mapped raster)
+_raster_cache = None
+# Cache path -> memory-mapped array
+_mapped_arrays = {}
+
+def pack_rgb(rgb):
+    """
+    Packs RGB values into a single integer per colour (e.g. (255, 0, 0) -> 0xFF0000).
+    Works on tuples as well as on (..., 3) arrays.
+    """
+    if isinstance(rgb, tuple):
+        return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+def label_dtype(provinces):
+    """
+    Smallest unsigned integer type that can hold every province ID.
+    """
+    max_id = max(provinces.values(), default=0)
+    return np.uint16 if max_id <= np.iinfo(np.uint16).max else np.uint32
+
+def build_province_raster(provinces=None, image_path=PROVINCES_IMAGE_PATH):
+    """
+    Decodes the province map into a 2D array holding the province ID of every pixel.
+    Pixels whose colour is not listed in provinces.txt get ID 0.
+
+    :param provinces: The province RGB -> ID dictionary (loaded from provinces.txt if omitted)
+    :param image_path: Path to the province map image
+    :return: A (height, width) array of province IDs
+    """
+    if provinces is None:
+        provinces = load_provinces()
+
+    img = Image.open(image_path).convert("RGB")
+    packed = pack_rgb(np.asarray(img))
+
+    # Sorted colour keys so every pixel can be resolved with a binary search
+    keys = np.array(sorted(pack_rgb(rgb) for rgb in provinces), dtype=np.uint32)
+    ids = np.array([provinces[((k >> 16) & 255, (k >> 8) & 255, k & 255)] for k in keys.tolist()], dtype=label_dtype(provinces))
+    if len(keys) == 0:
+        return np.zeros(packed.shape, dtype=ids.dtype)
+
+    index = np.searchsorted(keys, packed)
+    np.clip(index, 0, len(keys) - 1, out=index)
+    return np.where(keys[index] == packed, ids[index], 0).astype(ids.dtype, copy=False)
+
+def build_colour_lut(province_to_color, provinces):
+    """
+    Builds a lookup table that maps a province ID to an RGBA colour.
+    Provinces without a colour stay fully transparent.
+
+    :param province_to_color: The province RGB -> region RGB dictionary from build_color_mapping
+    :param provinces: The province RGB -> ID dictionary
+    :return: A (max_id + 1, 4) uint8 array
+    """
+    lut = np.zeros((max(provinces.values(), default=0) + 1, 4), dtype=np.uint8)
+    for province_rgb, color in province_to_color.items():
+        province_id = provinces.get(province_rgb)
+        if province_id is not None:
+            lut[province_id] = color + (255,)
+    return lut
+
+def region_raster(mode, labels, index):
+    """
+    Relabels the province raster with one label per region colour of a mode, which dissolves
+    provinces into their regions.
+
+    :return: (region label raster, list of region colours where label i + 1 is colours[i])
+    """
+    province_to_color = index.color_mapping(mode)
+    colors = sorted(set(province_to_color.values()))
+    color_labels = {color: i + 1 for i, color in enumerate(colors)}
+    lut = np.zeros(max(index.provinces.values(), default=0) + 1, dtype=np.int32)
+    for province_rgb, color in province_to_color.items():
+        lut[index.provinces[province_rgb]] = color_labels[color]
+    return lut[labels], colors
+
+def label_geometry(labels):
+    """
+    Pixel area, bounding box, centroid and number of separate (4-connected) islands of every label.
+    Each label is measured inside its own bounding box, so the work is proportional to the labels' size.
+
+    :param labels: A 2D array of non-negative integer labels (0 is not measured)
+    :return: A (max label + 1, 8) float64 array with the columns of GEOMETRY_COLUMNS (zeros for absent labels)
+    """
+    labels = np.asarray(labels)
+    table = np.zeros((int(labels.max(initial=0)) + 1, len(GEOMETRY_COLUMNS)), dtype=np.float64)
+    for label, bounds in enumerate(ndimage.find_objects(labels), start=1):
+        if bounds is None:
+            continue
+        mask = labels[bounds] == label
+        rows, cols = np.nonzero(mask)
+        top, left = bounds[0].start, bounds[1].start
+        table[label] = [
+            len(rows),
+            left,
+            top,
+            bounds[1].stop - left,
+            bounds[0].stop - top,
+            left + cols.mean() + 0.5,
+            top + rows.mean() + 0.5,
+            ndimage.label(mask)[1],
+        ]
+    return table
+
+def _signature():
+    """
+    Cheap change detector for the raster inputs (modification time and size of both files).
+    """
+    return tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, (PROVINCES_IMAGE_PATH, PROVINCES_TXT_PATH)))
+
+def raster_key():
+    """
+    Content hash of provinces.png and provinces.txt, used to name the cached raster.
+    """
+    digest = hashlib.sha256()
+    for path in (PROVINCES_IMAGE_PATH, PROVINCES_TXT_PATH):
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def cache_path(key, name):
+    """
+    Path of a cached array for one map version, e.g. cache/raster/<key>.labels.npy.
+    """
+    return os.path.join(CACHE_DIR, f"{key}.{name}.npy")
+
+def store_array(path, array):
+    """
+    Saves an array as .npy with write_file, so readers never see a half-written file.
+    """
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    write_file(path, buffer.getbuffer())
+
+def load_province_raster():
+    """
+    Returns the province-ID raster for the current map, decoding provinces.png only when
+    the map or provinces.txt changed. The raster is stored as a .npy file in cache/raster
+    and memory-mapped, so it is shared between regenerations and server restarts.
+    """
+    global _raster_cache
+
+    signature = _signature()
+    if _raster_cache is not None and _raster_cache[0] == signature:
+        return _raster_cache[2]
+
+    key = raster_key()
+    if _raster_cache is not None and _raster_cache[1] == key:
+        _raster_cache = (signature, key, _raster_cache[2])
+        return _raster_cache[2]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    labels_path = cache_path(key, "labels")
+    if not os.path.exists(labels_path):
+        labels = build_province_raster()
+        store_array(labels_path, labels)
+        # Province areas, bounding boxes and centroids are measured while the decoded raster is at hand
+        store_array(cache_path(key, "geometry"), label_geometry(labels))
+        print(f"Province raster cached as {labels_path}")
+
+        # Rasters of older map versions are never used again
+        for file_name in os.listdir(CACHE_DIR):
+            if file_name.endswith(".npy") and not file_name.startswith(key):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, file_name))
+                except OSError:
+                    pass
+
+    _raster_cache = (signature, key, np.load(labels_path, mmap_mode="r"))
+    return _raster_cache[2]
+
+def raster_version():
+    """
+    Content key of the current province raster.
+    """
+    load_province_raster()
+    return _raster_cache[1]
+
+def build_pixel_index(labels):
+    """
+    Groups the pixels of the raster by province.
+    The flat pixel indices of province p are order[starts[p]:starts[p + 1]].
+
+    :return: (order, starts)
+    """
+    flat = np.asarray(labels).ravel()
+    order = np.argsort(flat, kind="stable").astype(np.uint32 if flat.size <= np.iinfo(np.uint32).max else np.int64)
+    starts = np.zeros(int(flat.max(initial=0)) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(flat), out=starts[1:])
+    return order, starts
+
+def pixel_index_paths():
+    """
+    Cache paths of the (order, starts) pixel index of the current raster, building it if needed.
+    Worker processes memory-map these files instead of receiving a copy of the index.
+    """
+    labels = load_province_raster()
+    key = _raster_cache[1]
+    paths = (cache_path(key, "order"), cache_path(key, "starts"))
+    if not all(os.path.exists(path) for path in paths):
+        for path, array in zip(paths, build_pixel_index(labels)):
+            store_array(path, array)
+    return paths
+
+def open_cached_array(path):
+    """
+    Memory-maps a cached array, once per process.
+    """
+    if path not in _mapped_arrays:
+        _mapped_arrays[path] = np.load(path, mmap_mode="r")
+    return _mapped_arrays[path]
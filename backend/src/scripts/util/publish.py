@@ -0,0 +1,101 @@
+import hashlib
+import io
+import os
+import shutil
+import threading
+
+# Published files are hard links to the generated ones, so generated files must never be rewritten
+# in place: everything here writes a temporary file and swaps it in with os.replace.
+# write_file is the one atomic writer of the backend; other modules build their bytes and call it.
+
+def temp_path(path):
+    """
+    Temporary file next to path, unique per process and thread so concurrent writers never share one.
+    PIDs repeat across restarts (the server is PID 1 in Docker), so a file a crashed run left under
+    this name is removed first: it may be a hard link that shares its content with a published file.
+    """
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.remove(temp)
+    except FileNotFoundError:
+        pass
+    return temp
+
+def file_digest(path):
+    """
+    Content hash of a file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def same_content(first, second):
+    """
+    Whether two existing files hold the same bytes (sizes are compared before anything is read).
+    """
+    if os.path.samefile(first, second):
+        return True
+    return os.path.getsize(first) == os.path.getsize(second) and file_digest(first) == file_digest(second)
+
+def publish_file(source, target):
+    """
+    Makes target hold the content of source without re-encoding it: a hard link where the
+    filesystem allows it, a copy otherwise. Nothing is written if target already has that content.
+
+    :return: True if target was (re)written
+    """
+    if os.path.exists(target) and same_content(source, target):
+        return False
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp = temp_path(target)
+    try:
+        os.link(source, temp)
+    except OSError:
+        shutil.copyfile(source, temp)
+    os.replace(temp, target)
+    return True
+
+def publish_folder(source_dir, target_dir):
+    """
+    Publishes every file of source_dir into target_dir and removes the files of target_dir that
+    source_dir no longer has.
+
+    :return: Number of files that were (re)written
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    names = {name for name in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, name))}
+    for name in os.listdir(target_dir):
+        path = os.path.join(target_dir, name)
+        if name not in names and os.path.isfile(path):
+            os.remove(path)
+    return sum(publish_file(os.path.join(source_dir, name), os.path.join(target_dir, name)) for name in sorted(names))
+
+def write_file(path, data):
+    """
+    Writes bytes or text to path through a temporary file. Path is left alone when it already
+    holds exactly this content, so its modification time (and any cache keyed on it) survives.
+
+    :return: True if path was (re)written
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = temp_path(path)
+    with open(temp, "wb") as file:
+        file.write(data)
+    if os.path.exists(path) and same_content(temp, path):
+        os.remove(temp)
+        return False
+    os.replace(temp, path)
+    return True
+
+def save_image(img, path):
+    """
+    Encodes a PIL image as PNG and writes it with write_file.
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return write_file(path, buffer.getvalue())
@@ -1,5 +1,8 @@
 import os
 import json
+import threading
+from .publish import write_file
+from .title_graph import compile_title_graph, connected_titles, report_problems
 
 # === Paths ===
 BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
@@ -10,14 +13,30 @@ DEFINES_DIR = os.path.join(BASE_DIR, "defines")
 RAW_QUEUE_PATH = os.path.join(INPUT_DIR, "queue.json")
 COMPILED_QUEUE_PATH = os.path.join(DEFINES_DIR, "queue.json")
 
+# Uploads add to the raw queue while a regeneration reads and clears it, so every
+# read-modify-write of input/queue.json holds this lock
+queue_lock = threading.Lock()
+# Mode -> raw entries the running regeneration of that mode compiled (cleared when it finishes)
+_taken = {}
+
+def _load_raw_queue():
+    if not os.path.exists(RAW_QUEUE_PATH):
+        return {}
+    with open(RAW_QUEUE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
 # === Compiler ===
 def compile_queue():
-    if not os.path.exists(RAW_QUEUE_PATH):
-        print("No raw queue.json found in input/")
-        return
+    """
+    Expands the raw queue into defines/queue.json.
 
-    with open(RAW_QUEUE_PATH, "r", encoding="utf-8") as f:
-        raw_queue = json.load(f)
+    :return: The raw queue that was compiled (mode -> list of "r,g,b" strings)
+    """
+    with queue_lock:
+        if not os.path.exists(RAW_QUEUE_PATH):
+            print("No raw queue.json found in input/")
+            return {}
+        raw_queue = _load_raw_queue()
 
     compiled_queue = {}
 
@@ -38,21 +57,11 @@ def compile_queue():
             if rgb:
                 rgb_to_id[rgb] = region_id
 
-        expanded_ids = set()
-
-        def expand(region_id):
-            if region_id not in region_data:
-                return
-            if region_id in expanded_ids:
-                return
-            expanded_ids.add(region_id)
-
-            for subject in region_data[region_id].get("subjects", []):
-                expand(subject)
-
-            overlord = region_data[region_id].get("overlord")
-            if overlord:
-                expand(overlord)
+        # Regions are regenerated together with their whole overlord tree
+        graph = compile_title_graph(region_data)
+        report_problems(graph, mode.capitalize())
+        start_ids = []
+        removed_rgbs = set()
 
         # Expand from RGBs in the raw queue
         initial_rgb_list = raw_queue[mode]
@@ -60,9 +69,16 @@ def compile_queue():
         for rgb in initial_rgb_list:
             region_id = rgb_to_id.get(rgb)
             if region_id:
-                expand(region_id)
+                start_ids.append(region_id)
             else:
-                print(f"⚠️ No region found with RGB: {rgb}")
+                # Removed or recoloured regions (and unassigned black areas): queued so their old images are cleared
+                try:
+                    removed_rgbs.add(tuple(map(int, rgb.split(","))))
+                    print(f"⚠️ No region found with RGB: {rgb}, queued as is")
+                except (AttributeError, ValueError):
+                    print(f"⚠️ No region found with RGB: {rgb}")
+
+        expanded_ids = connected_titles(graph, start_ids)
 
         # Convert back to RGBs for the compiled queue
         from ..mapgen.regiongen import sanitize_filename  # Adjust the import path as needed
@@ -72,12 +88,23 @@ def compile_queue():
             for rid in expanded_ids
             if "rgb" in region_data[rid]
         ]
+        compiled_queue[mode] += [sanitize_filename(rgb) for rgb in sorted(removed_rgbs)]
 
-    os.makedirs(DEFINES_DIR, exist_ok=True)
-    with open(COMPILED_QUEUE_PATH, "w", encoding="utf-8") as f:
-        json.dump(compiled_queue, f, indent=2)
+    write_file(COMPILED_QUEUE_PATH, json.dumps(compiled_queue, indent=2))
 
     print("✅ Compiled queue written to defines/queue.json")
+    return raw_queue
+
+def take_queue(mode: str) -> list:
+    """
+    Compiles the queue for a regeneration of mode and returns its regions. The raw entries that
+    were compiled are remembered, so clear_taken removes only those once the regeneration is done.
+    """
+    mode = mode.lower()
+    raw_queue = compile_queue()
+    with queue_lock:
+        _taken[mode] = list(raw_queue.get(mode, []))
+    return load_queue(mode)
 
 # === Load compiled queue for generation ===
 def load_queue(mode: str) -> list:
@@ -92,39 +119,69 @@ def load_queue(mode: str) -> list:
 
 # === Save to raw input queue ===
 def _save_queue(queue):
-    os.makedirs(INPUT_DIR, exist_ok=True)
-    with open(RAW_QUEUE_PATH, "w", encoding="utf-8") as f:
-        json.dump(queue, f, ensure_ascii=False, indent=2)
+    write_file(RAW_QUEUE_PATH, json.dumps(queue, ensure_ascii=False, indent=2))
+
+def _add_entry(queue, mode, path):
+    entries = queue.setdefault(mode, [])
+    # An entry a running regeneration took is added again: that regeneration clears its copy
+    if entries.count(path) <= _taken.get(mode, []).count(path):
+        entries.append(path)
+
+# === Replace raw queue ===
+def replace_queue(queue: dict):
+    with queue_lock:
+        _save_queue(queue)
 
 # === Add region to raw queue ===
 def enqueue(mode: str, path: str):
     mode = mode.lower()
-    queue = {}
-
-    if os.path.exists(RAW_QUEUE_PATH):
-        with open(RAW_QUEUE_PATH, "r", encoding="utf-8") as f:
-            queue = json.load(f)
-
-    if mode not in queue:
-        queue[mode] = []
+    with queue_lock:
+        queue = _load_raw_queue()
+        _add_entry(queue, mode, path)
+        _save_queue(queue)
 
-    if path not in queue[mode]:
-        queue[mode].append(path)
+# === Add many regions to raw queue ===
+def enqueue_all(additions: dict):
+    """
+    Adds RGB strings to the raw queue of several modes in one write.
 
-    _save_queue(queue)
+    :param additions: Mode -> list of "r,g,b" strings
+    """
+    with queue_lock:
+        queue = _load_raw_queue()
+        for mode, paths in additions.items():
+            for path in paths:
+                _add_entry(queue, mode.lower(), path)
+        _save_queue(queue)
 
 # === Clear raw queue by mode ===
 def clear_mode(mode: str):
     mode = mode.lower()
-    queue = {}
-
-    if os.path.exists(RAW_QUEUE_PATH):
-        with open(RAW_QUEUE_PATH, "r", encoding="utf-8") as f:
-            queue = json.load(f)
-
-    if mode in queue:
-        del queue[mode]
+    with queue_lock:
+        queue = _load_raw_queue()
+        if mode in queue:
+            del queue[mode]
+            _save_queue(queue)
+            print(f"Cleared all entries under mode '{mode}'.")
+        else:
+            print(f"No entries to clear for mode '{mode}'.")
+
+# === Clear the entries a regeneration took ===
+def clear_taken(mode: str):
+    """
+    Removes the raw entries take_queue compiled for mode. Entries queued since then stay queued.
+    """
+    mode = mode.lower()
+    with queue_lock:
+        taken = _taken.pop(mode, [])
+        if not taken:
+            return
+        queue = _load_raw_queue()
+        entries = queue.get(mode, [])
+        for path in taken:
+            if path in entries:
+                entries.remove(path)
+        if mode in queue and not entries:
+            del queue[mode]
         _save_queue(queue)
-        print(f"Cleared all entries under mode '{mode}'.")
-    else:
-        print(f"No entries to clear for mode '{mode}'.")
+        print(f"Cleared {len(taken)} regenerated entries under mode '{mode}', {len(entries)} left.")
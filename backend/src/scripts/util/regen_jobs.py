@@ -0,0 +1,170 @@
+from collections import OrderedDict
+import concurrent.futures
+import threading
+import time
+import traceback
+import uuid
+
+from .regeneration import run_regeneration
+
+# Finished jobs kept for the status endpoint
+MAX_FINISHED_JOBS = 50
+
+# How much a regeneration type covers: a pending job is merged into the wider of the two types
+REGEN_SCOPE = {"textonly": 0, "queued": 1, "fullregen": 2}
+
+# The only executor regenerations run on; one worker, so jobs run one after another
+_regen_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="regen")
+_jobs = OrderedDict()
+_pending = None
+_lock = threading.Lock()
+
+class JobCancelled(Exception):
+    pass
+
+def regen_scope(regen_type):
+    return REGEN_SCOPE.get(regen_type.lower(), REGEN_SCOPE["queued"])
+
+class RegenJob:
+    """
+    One scheduled regeneration and its progress.
+    """
+    def __init__(self, regen_type):
+        self.id = uuid.uuid4().hex
+        self.regen_type = regen_type
+        self.status = "pending"
+        self.stage = None
+        self.mode = None
+        self.regions_done = {}
+        self.regions_total = {}
+        self.requests = 1
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+
+    def progress(self, stage, mode=None, done=None, total=None):
+        """
+        Called by run_regeneration; raising here stops the regeneration at the next step.
+        """
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.stage = stage
+        self.mode = mode
+        if mode is not None and total is not None:
+            self.regions_done[mode] = done
+            self.regions_total[mode] = total
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "regen_type": self.regen_type,
+            "status": self.status,
+            "stage": self.stage,
+            "mode": self.mode,
+            "regions_done": dict(self.regions_done),
+            "regions_total": dict(self.regions_total),
+            "requests": self.requests,
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+def _run(job):
+    global _pending
+
+    with _lock:
+        if _pending is job:
+            _pending = None
+        if job.status == "cancelled":
+            return
+        job.status = "running"
+        job.started = time.time()
+
+    try:
+        run_regeneration(job.regen_type, progress=job.progress)
+        status = "done"
+    except JobCancelled:
+        print(f"🛑 Regeneration {job.id} cancelled")
+        status = "cancelled"
+    except Exception as e:
+        traceback.print_exc()
+        job.error = str(e)
+        status = "failed"
+
+    with _lock:
+        job.status = status
+        job.stage = None if status == "done" else job.stage
+        job.finished = time.time()
+        _trim_jobs()
+
+def _trim_jobs():
+    finished = [job_id for job_id, job in _jobs.items() if job.finished is not None]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+def submit_regeneration(regen_type):
+    """
+    Schedules a regeneration. A request that arrives while another job is still waiting to start
+    is merged into that job instead of queueing a second one.
+
+    :return: (job, merged) where merged tells whether an existing pending job was reused
+    """
+    global _pending
+
+    with _lock:
+        if _pending is not None:
+            if regen_scope(regen_type) > regen_scope(_pending.regen_type):
+                _pending.regen_type = regen_type
+            _pending.requests += 1
+            return _pending, True
+
+        job = RegenJob(regen_type)
+        _jobs[job.id] = job
+        _pending = job
+    _regen_executor.submit(_run, job)
+    return job, False
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+def list_jobs():
+    with _lock:
+        return [job.to_dict() for job in _jobs.values()]
+
+def cancel_job(job_id):
+    """
+    Cancels a job. A pending job never starts; a running one stops at its next progress step.
+
+    :return: The job's status, or None if the job does not exist
+    """
+    global _pending
+
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == "pending":
+            job.status = "cancelled"
+            job.finished = time.time()
+            if _pending is job:
+                _pending = None
+        elif job.status == "running":
+            job.cancel_requested = True
+        return job.to_dict()
+
+def shutdown():
+    """
+    Cancels every job that has not started and stops the executor without waiting for a running job.
+    """
+    with _lock:
+        for job in _jobs.values():
+            if job.status == "pending":
+                job.status = "cancelled"
+                job.finished = time.time()
+    _regen_executor.shutdown(wait=False, cancel_futures=True)
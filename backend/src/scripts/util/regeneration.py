@@ -1,18 +1,27 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from src.scripts.compile.nation_compiler import process_nations
-from src.scripts.mapgen.mapgen import create_map
-from src.scripts.mapgen.regiongen import generate_regions
+from src.scripts.mapgen.mapgen import create_maps
+from src.scripts.mapgen.regiongen import generate_all_regions
+from src.scripts.mapgen.tilegen import build_base_tiles
+from src.scripts.mapgen.vectorgen import generate_vectors
+from src.scripts.mapgen.atlasgen import build_region_atlas, build_banner_atlas
 from src.scripts.util.queue import load_queue, compile_queue
+from src.scripts.util.response_cache import bump_version
+from src.scripts.util.task_lock import regen_lock
 import os
 import json
 
-executor = ThreadPoolExecutor()
-regen_lock = asyncio.Lock()
-
 RAW_QUEUE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "input", "queue.json")
 COMPILED_QUEUE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "defines", "queue.json")
 
+# Crop region images to their content and publish a sprite manifest next to them
+CROP_REGIONS = False
+# Worker processes for region rendering (None = one per CPU, 1 = render serially)
+REGION_WORKERS = None
+# Douglas-Peucker tolerance of the region polygons, in map pixels (0 keeps every pixel corner)
+VECTOR_TOLERANCE = 1.0
+# Also pack region and banner images into atlas pages with a UV manifest (output/atlas)
+BUILD_ATLASES = False
+
 def print_queues():
     print("📥 RAW QUEUE (input/queue.json):")
     if os.path.exists(RAW_QUEUE_PATH):
@@ -30,33 +39,81 @@ def print_queues():
     else:
         print("❌ No compiled queue file found.")
 
-def run_regeneration(regen_type: str):
+def run_regeneration(regen_type: str, progress=None):
+    """
+    Compiles the input data and regenerates maps and regions. Only one regeneration runs at a time.
+
+    :param regen_type: "fullregen", "textonly", or anything else for a queued regeneration
+    :param progress: Optional function called as progress(stage, mode=None, done=None, total=None)
+    """
+    def report(stage, mode=None, done=None, total=None):
+        if progress is not None:
+            progress(stage, mode, done, total)
+
     print("🔁 Regeneration task started")  # ✅ debug
 
     def sync_task():
         print("🔧 Sync task starting...")
         modes = ["nation", "duchy", "kingdom", "county", "empire"]
+        report("nations")
         process_nations()
+        if BUILD_ATLASES:
+            build_banner_atlas("nation", True)
 
+        report("queue")
         compile_queue()
         print("✅ Queue compiled")
         print_queues()  # 👈 Add this here
 
         if regen_type.lower() != "textonly":
+            active_modes = []
             for mode in modes:
                 queue = load_queue(mode)
                 if regen_type.lower() != "fullregen":
                     if not queue:
                         print(f"⚠️ Skipping {mode}: Empty queue")
                         continue
+                active_modes.append(mode)
 
-                print(f"🛠️ Processing mode: {mode}")
+            report("tiles")
+            build_base_tiles()
 
-                create_map(mode, f"{mode}_map", True)
-                print(f"🗺️ Map generated for {mode}")
+            # All mode maps come from a single pass over the province raster
+            report("maps")
+            create_maps(active_modes, True)
+            print(f"🗺️ Maps generated for {', '.join(active_modes)}")
 
-                generate_regions(mode, borders=True, frontend_save=True, queued_regen=(regen_type.lower() != "fullregen"))
-                print(f"🎨 Regions generated for {mode}")
+            # Region outlines as GeoJSON and SVG polygons
+            report("vectors")
+            generate_vectors(active_modes, True, VECTOR_TOLERANCE)
+            print(f"📐 Vectors generated for {', '.join(active_modes)}")
+
+            # Regions of all modes are rendered as independent jobs on one process pool
+            print(f"🛠️ Processing modes: {', '.join(active_modes)}")
+            report("regions")
+            generate_all_regions(
+                active_modes,
+                borders=True,
+                frontend_save=True,
+                queued_regen=(regen_type.lower() != "fullregen"),
+                cropped=CROP_REGIONS,
+                workers=REGION_WORKERS,
+                progress=lambda mode, done, total: report("regions", mode, done, total),
+            )
+            print(f"🎨 Regions generated for {', '.join(active_modes)}")
+
+            if BUILD_ATLASES:
+                report("atlas")
+                for mode in active_modes:
+                    build_region_atlas(mode, True)
+                print(f"🧩 Atlases packed for {', '.join(active_modes)}")
 
         print("✅ Regeneration complete.")
-    sync_task()
\ No newline at end of file
+
+    # Two regenerations would delete each other's output folders
+    with regen_lock:
+        try:
+            sync_task()
+        finally:
+            # Cached /data and /map responses are reloaded from the new files
+            bump_version()
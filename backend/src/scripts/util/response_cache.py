@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+# Entries kept in memory before the least recently used ones are dropped
+MAX_ENTRIES = 4096
+
+# Bumped after every regeneration so entries are reloaded even if a file's mtime did not change
+_version = 0
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def bump_version():
+    """
+    Invalidates every cached response (called when a regeneration finishes).
+    """
+    global _version
+    with _lock:
+        _version += 1
+        _entries.clear()
+
+def compact_json(raw):
+    """
+    Re-serializes JSON the same way JSONResponse does, so cached bodies match the old responses.
+    """
+    data = json.loads(raw)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def load_entry(path, media_type, transform=None, compress=False):
+    """
+    Returns the cached response body of a file, reading it again only if the file's mtime or size
+    changed or a regeneration finished since it was cached.
+
+    :param transform: Optional function applied to the raw file bytes (e.g. compact_json)
+    :param compress: Also keep a gzip-compressed copy of the body
+    :return: A dictionary with body, gzip_body, etag and media_type, or None if the file does not exist
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        with _lock:
+            _entries.pop(path, None)
+        return None
+    signature = (st.st_mtime_ns, st.st_size, _version)
+
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry["signature"] == signature:
+            _entries.move_to_end(path)
+            return entry
+
+    with open(path, "rb") as f:
+        body = f.read()
+    if transform is not None:
+        body = transform(body)
+
+    entry = {
+        "signature": signature,
+        "body": body,
+        "gzip_body": gzip.compress(body, 6) if compress else None,
+        "etag": '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+        "media_type": media_type,
+    }
+    with _lock:
+        _entries[path] = entry
+        _entries.move_to_end(path)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return entry
+
+def cached_response(request: Request, entry):
+    """
+    Builds the response for a cached entry: 304 if the client already has it, gzip if accepted.
+    """
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    if entry["gzip_body"] is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=entry["gzip_body"], media_type=entry["media_type"], headers=headers)
+    return Response(content=entry["body"], media_type=entry["media_type"], headers=headers)
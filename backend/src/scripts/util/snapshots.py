@@ -0,0 +1,147 @@
+import errno
+import os
+import shutil
+import time
+from .publish import publish_folder, write_file
+
+# Versions of a folder kept on disk for rollback, the current one included
+SNAPSHOTS_KEPT = 3
+
+# Name given to a folder from before snapshots when it is moved aside (sorts before every real version)
+LEGACY_VERSION = "00000000-000000"
+
+def snapshot_root(link_path):
+    """
+    Folder holding the versions of a published folder, e.g. output/regions/county is a link
+    into output/regions/_snapshots/county/<version>.
+    """
+    return os.path.join(os.path.dirname(link_path), "_snapshots", os.path.basename(link_path))
+
+def marker_path(root, version):
+    """
+    File marking a snapshot as complete, written before it is first activated. Folders without it
+    are still being written, or were left behind by a run that failed.
+    """
+    return os.path.join(root, f"{version}.complete")
+
+def list_versions(link_path):
+    """
+    Complete versions of a folder that are on disk, oldest first.
+    """
+    root = snapshot_root(link_path)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name)) and os.path.exists(marker_path(root, name))
+    )
+
+def current_version(link_path):
+    """
+    Version link_path points at, or None before the first snapshot was activated.
+    """
+    try:
+        with open(os.path.join(snapshot_root(link_path), "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def create_snapshot(link_path, version=None, seed=False):
+    """
+    Creates the folder of a new version of link_path. Nothing reads it until it is activated.
+
+    :param version: Version ID (a new time-based ID if omitted)
+    :param seed: Start with hard links to every file of the current version, so a partial
+                 regeneration only has to replace the files that changed. Files must then be
+                 replaced (removed and written again), never rewritten in place.
+    :return: Path of the snapshot folder
+    """
+    root = snapshot_root(link_path)
+    os.makedirs(root, exist_ok=True)
+    if version is None:
+        version = time.strftime("%Y%m%d-%H%M%S")
+        taken = set(list_versions(link_path))
+        suffix = 1
+        while version in taken:
+            version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+            suffix += 1
+
+    path = os.path.join(root, version)
+    # Left over from a regeneration that did not finish
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    if seed and os.path.isdir(link_path):
+        for file_name in os.listdir(link_path):
+            source = os.path.join(link_path, file_name)
+            if os.path.isfile(source):
+                try:
+                    os.link(source, os.path.join(path, file_name))
+                except OSError:
+                    shutil.copyfile(source, os.path.join(path, file_name))
+    return path
+
+def discard_snapshot(snapshot_path):
+    """
+    Removes a snapshot folder and its completion marker, e.g. one a failed run was writing.
+    """
+    shutil.rmtree(snapshot_path, ignore_errors=True)
+    try:
+        os.remove(marker_path(os.path.dirname(snapshot_path), os.path.basename(snapshot_path)))
+    except FileNotFoundError:
+        pass
+
+def symlinks_unsupported(error):
+    """
+    Whether os.symlink failed because the platform or filesystem has no symbolic links (or, on
+    Windows, the user may not create them), rather than for a reason that copying would hide.
+    """
+    if isinstance(error, NotImplementedError):
+        return True
+    return error.errno in (errno.EPERM, errno.EACCES, errno.ENOTSUP, errno.EOPNOTSUPP) or getattr(error, "winerror", None) == 1314
+
+def activate_snapshot(link_path, version, keep=SNAPSHOTS_KEPT):
+    """
+    Points link_path at a version by renaming a new symbolic link over the old one, so readers
+    see either the old or the new version in full, then removes all but the newest keep versions
+    and any incomplete snapshot. The activated version is marked complete.
+    Where symbolic links are not available, link_path stays a real folder that is synced with
+    the version instead (not atomic).
+    """
+    root = snapshot_root(link_path)
+    target = os.path.join(root, version)
+    if not os.path.isdir(target):
+        raise FileNotFoundError(f"No snapshot {version} of {link_path}")
+    write_file(marker_path(root, version), "")
+
+    temp_path = f"{link_path}.{os.getpid()}.tmp"
+    if os.path.lexists(temp_path):
+        # Left by a run that crashed (PIDs repeat across restarts)
+        os.remove(temp_path)
+    try:
+        os.symlink(os.path.relpath(target, os.path.dirname(link_path)), temp_path, target_is_directory=True)
+    except (OSError, NotImplementedError) as error:
+        if not symlinks_unsupported(error):
+            raise
+        if os.path.islink(link_path):
+            # Never sync through a link, that would overwrite the version it points at
+            os.remove(link_path)
+        publish_folder(target, link_path)
+    else:
+        if os.path.isdir(link_path) and not os.path.islink(link_path):
+            # Folder from before snapshots: moved aside once so the link can take its place
+            legacy_path = os.path.join(root, LEGACY_VERSION)
+            discard_snapshot(legacy_path)
+            os.rename(link_path, legacy_path)
+            write_file(marker_path(root, LEGACY_VERSION), "")
+        os.replace(temp_path, link_path)
+    write_file(os.path.join(root, "CURRENT"), version)
+
+    complete = list_versions(link_path)
+    for old_version in complete[:-keep]:
+        if old_version != version:
+            discard_snapshot(os.path.join(root, old_version))
+    # Left behind by failed runs (only one run writes snapshots of a folder at a time)
+    for name in os.listdir(root):
+        if os.path.isdir(os.path.join(root, name)) and name not in complete:
+            discard_snapshot(os.path.join(root, name))
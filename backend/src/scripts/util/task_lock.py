@@ -1,4 +1,4 @@
-import asyncio
+import threading
 
-# Shared async lock to prevent overlapping regenerations
-regen_lock = asyncio.Lock()
\ No newline at end of file
+# Held for the whole of a regeneration so two runs can never overlap
+regen_lock = threading.Lock()
@@ -0,0 +1,108 @@
+def compile_title_graph(titles, parent_key="overlord", provinces_key="provinces"):
+    """
+    Orders a title graph (e.g. nations and their overlords) once, without recursion.
+
+    Links to a parent that does not exist are reported as dangling and ignored, and so are the
+    links that close a cycle (A -> B -> A), so every title ends up in a tree.
+
+    :param titles: Title ID -> title data; entries that are not dictionaries are skipped
+    :param parent_key: Key holding the ID of a title's parent
+    :param provinces_key: Key holding a title's list of provinces
+    :return: Dictionary with
+        "parents": title -> parent (titles without a valid parent are left out),
+        "children": title -> list of children, in title order,
+        "order": every title, each one after all of its children,
+        "sizes": title -> provinces of the title and all titles below it,
+        "subject_sizes": title -> provinces of the titles below it,
+        "cycles": list of cycles, each a list of titles,
+        "dangling": list of (title, missing parent)
+    """
+    titles = {title_id: data for title_id, data in titles.items() if isinstance(data, dict)}
+
+    parents = {}
+    dangling = []
+    for title_id, data in titles.items():
+        parent = data.get(parent_key)
+        if not parent:
+            continue
+        if parent in titles:
+            parents[title_id] = parent
+        else:
+            dangling.append((title_id, parent))
+
+    # Kahn's algorithm from the leaves up: a title is ready once all of its children are
+    pending = {title_id: 0 for title_id in titles}
+    for parent in parents.values():
+        pending[parent] += 1
+    order = [title_id for title_id, count in pending.items() if count == 0]
+    for title_id in order:  # order grows while it is walked
+        parent = parents.get(title_id)
+        if parent is not None:
+            pending[parent] -= 1
+            if pending[parent] == 0:
+                order.append(parent)
+
+    # Titles that were never ready all lie on cycles; cut one link per cycle and order the rest
+    cycles = []
+    if len(order) < len(titles):
+        ordered = set(order)
+        for title_id in titles:
+            if title_id in ordered:
+                continue
+            cycle = [title_id]
+            ordered.add(title_id)
+            while parents[cycle[-1]] != title_id:
+                cycle.append(parents[cycle[-1]])
+                ordered.add(cycle[-1])
+            cycles.append(cycle)
+
+            del parents[cycle[-1]]
+            # The cycle is now a chain from title_id up to cycle[-1], which became a root
+            order.extend(cycle)
+
+    children = {title_id: [] for title_id in titles}
+    for title_id in titles:
+        if title_id in parents:
+            children[parents[title_id]].append(title_id)
+
+    sizes = {}
+    subject_sizes = {}
+    for title_id in order:
+        subject_sizes[title_id] = sum(sizes[child] for child in children[title_id])
+        sizes[title_id] = len(titles[title_id].get(provinces_key, [])) + subject_sizes[title_id]
+
+    return {
+        "parents": parents,
+        "children": children,
+        "order": order,
+        "sizes": sizes,
+        "subject_sizes": subject_sizes,
+        "cycles": cycles,
+        "dangling": dangling,
+    }
+
+def connected_titles(graph, start_ids):
+    """
+    Every title in the same tree as one of start_ids: all titles above and below them, and
+    the other subjects of their overlords.
+    """
+    found = set()
+    stack = [title_id for title_id in start_ids if title_id in graph["children"]]
+    while stack:
+        title_id = stack.pop()
+        if title_id in found:
+            continue
+        found.add(title_id)
+        stack.extend(graph["children"][title_id])
+        if title_id in graph["parents"]:
+            stack.append(graph["parents"][title_id])
+    return found
+
+def report_problems(graph, label):
+    """
+    Prints the cycles and dangling parents found by compile_title_graph.
+    """
+    for cycle in graph["cycles"]:
+        print(f"⚠️ {label} cycle {' -> '.join(cycle + cycle[:1])}, link {cycle[-1]} -> {cycle[0]} ignored")
+    for title_id, parent in graph["dangling"]:
+        print(f"⚠️ {label} {title_id} has unknown overlord {parent}, ignored")
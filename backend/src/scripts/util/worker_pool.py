@@ -0,0 +1,70 @@
+from fastapi import HTTPException, Request
+import asyncio
+import concurrent.futures
+import functools
+import json
+import multiprocessing
+import threading
+from .publish import write_file
+
+# Threads available to the API for blocking disk, JSON and image work
+IO_WORKERS = 4
+
+# Processes available to the API for CPU-heavy rendering (banner batches)
+RENDER_WORKERS = 2
+
+# Largest request body accepted by the upload routes
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+# Bounded so a burst of uploads can not start an unbounded number of threads
+_io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="api-io")
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function on the API's worker pool so the event loop keeps serving other requests.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_pool, functools.partial(func, *args, **kwargs))
+
+# Started on first use, from a clean forkserver process rather than by forking the threaded API
+# process (spawn where forkserver is not available)
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+            _render_pool = concurrent.futures.ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=context)
+        return _render_pool
+
+async def run_in_process(func, *args):
+    """
+    Runs a CPU-heavy function on the API's render processes. It holds neither the event loop nor a
+    thread of the I/O pool, and in-flight render work never uses more than RENDER_WORKERS cores.
+    func and its arguments must be picklable.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_pool(), func, *args)
+
+async def read_json_body(request: Request, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Reads a JSON request body chunk by chunk and parses it on the worker pool.
+    The loop is free between chunks, and bodies larger than max_bytes are refused with 413.
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail="Request body too large.")
+    try:
+        return await run_blocking(json.loads, bytes(body))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON.")
+
+def write_json(path, data, **dump_args):
+    """
+    Writes JSON atomically with publish.write_file (dump_args are passed to json.dumps).
+    """
+    write_file(path, json.dumps(data, **dump_args))
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import shutil
+import time
+
+import httpx
+import pytest
+
+from server import app
+from src.api import data_routes
+from src.scripts.util import queue, worker_pool
+
+# Uploaded counties: several MB of JSON, so parsing, the dirty region diff and the write take a while
+COUNTIES = 50000
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    shutil.copy(f"{data_routes.DATA_DIR}/duchy.json", tmp_path / "duchy.json")
+    monkeypatch.setattr(data_routes, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(queue, "RAW_QUEUE_PATH", str(tmp_path / "queue.json"))
+    return tmp_path
+
+def county_upload():
+    return json.dumps({
+        f"COUNTY_{i}": {
+            "name": f"County {i}",
+            "provinces": list(range(i * 10, i * 10 + 10)),
+            "rgb": f"{i % 256},{i // 256 % 256},{i // 65536}",
+        }
+        for i in range(COUNTIES)
+    }).encode()
+
+async def longest_read_gap(client, upload):
+    """
+    Reads /data/duchy back to back until the upload is answered.
+
+    :return: Number of reads answered meanwhile, and the longest wait for an answer (the start and
+             the end of the upload count as answers, so a loop blocked by the upload shows up)
+    """
+    reads = 0
+    last = time.perf_counter()
+    longest = 0
+    while not upload.done():
+        response = await client.get("/data/duchy")
+        assert response.status_code == 200
+        reads += 1
+        now = time.perf_counter()
+        longest, last = max(longest, now - last), now
+        await asyncio.sleep(0.005)
+    await upload
+    return reads, max(longest, time.perf_counter() - last)
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("inline", [False, True], ids=["worker_pool", "inline"])
+async def test_large_upload_does_not_block_reads(data_dir, monkeypatch, inline):
+    if inline:
+        # The handlers as they were before the worker pool, to show this test notices the difference
+        async def run_inline(func, *args, **kwargs):
+            return func(*args, **kwargs)
+        monkeypatch.setattr(worker_pool, "run_blocking", run_inline)
+        monkeypatch.setattr(data_routes, "run_blocking", run_inline)
+
+    body = county_upload()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # Warm the response cache, the reads below should only wait for the event loop
+        assert (await client.get("/data/duchy")).status_code == 200
+
+        start = time.perf_counter()
+        upload = asyncio.create_task(client.post("/data/upload/county", content=body))
+        reads, longest = await longest_read_gap(client, upload)
+        elapsed = time.perf_counter() - start
+
+    assert upload.result().status_code == 200
+    assert len(json.loads((data_dir / "county.json").read_text(encoding="utf-8"))) == COUNTIES
+
+    # Reads kept being answered while the upload was processed, unless the handler blocked the loop
+    blocked = longest > elapsed / 4 or reads < 5
+    assert blocked == inline